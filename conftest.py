@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    # Фоновые задачи пишут в MEDIA_ROOT теста: дожидаемся их до того,
+    # как фикстуры удалят временный каталог
+    yield
+    from posts import background
+    background.wait(timeout=30)
@@ -1,10 +1,22 @@
 from django.contrib import admin
 
-from . import models
+from . import models, search
+
+
+class IndexedSearchMixin:
+    """Поиск в админке по FTS-индексу вместо ``LIKE '%...%'``.
+
+    ``search_fields`` остаются, чтобы админка показывала поле поиска.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search.filter_queryset(queryset, search_term), False
 
 
 @admin.register(models.Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author',)
     list_display_links = ('text',)
     search_fields = ('text',)
@@ -20,7 +32,7 @@ class GroupAdmin(admin.ModelAdmin):
 
 
 @admin.register(models.Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ('pk', 'post', 'author', 'text', 'created')
     search_fields = ('text',)
     list_filter = ('created',)
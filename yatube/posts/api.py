@@ -0,0 +1,161 @@
+"""JSON API v1 только для чтения: ленты, пост и его комментарии.
+
+Строки выбираются через ``values()`` — без сборки моделей — и листаются
+курсором, как HTML-ленты. ETag считается по версиям тегов кэша
+(``cache_tags``) до обращения к базе, поэтому опрос без изменений
+обходится ответом 304 без запросов за постами.
+"""
+from functools import wraps
+
+from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import condition, require_safe
+
+from . import cache_tags, timeline
+from .models import Comment, Group, Post, User
+from .paginator import paginate
+
+POST_FIELDS = ('id', 'text', 'pub_date', 'author__username', 'group__slug',
+               'image', 'comment_count')
+COMMENT_FIELDS = ('id', 'text', 'created', 'author__username')
+
+
+def project(queryset, fields):
+    return queryset.prefetch_related(None).values(*fields)
+
+
+def serialize_post(row):
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'pub_date': row['pub_date'].isoformat(),
+        'author': row['author__username'],
+        'group': row['group__slug'],
+        'image': default_storage.url(row['image']) if row['image'] else None,
+        'comment_count': row['comment_count'],
+    }
+
+
+def serialize_comment(row):
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'created': row['created'].isoformat(),
+        'author': row['author__username'],
+    }
+
+
+def link(request, **params):
+    query = request.GET.copy()
+    for name in ('page', 'after', 'before'):
+        query.pop(name, None)
+    query.update(params)
+    return f'{request.path}?{query.urlencode()}'
+
+
+def page_links(request, page):
+    paginator = page.paginator
+    if getattr(paginator, 'is_keyset', False):
+        after, before = paginator.next_cursor, paginator.previous_cursor
+        return (after and link(request, after=after),
+                before and link(request, before=before))
+    return (
+        page.has_next() and link(request, page=page.next_page_number()),
+        page.has_previous()
+        and link(request, page=page.previous_page_number()),
+    )
+
+
+def page_response(request, page, serialize):
+    next_link, previous_link = page_links(request, page)
+    return JsonResponse({
+        'results': [serialize(row) for row in page],
+        'next': next_link or None,
+        'previous': previous_link or None,
+    })
+
+
+def tagged(tags_for):
+    """Представление API с ETag по тегам, которые вернёт ``tags_for``.
+
+    Версии тегов читаются из общего кэша, поэтому 304 не отдаётся
+    процессом, который не видел записи в другом воркере.
+    """
+    def etag(request, **kwargs):
+        return cache_tags.fragment_key(request, *tags_for(request, **kwargs))
+
+    def decorator(view):
+        conditional = condition(etag_func=etag)(view)
+
+        @wraps(view)
+        def wrapper(request, **kwargs):
+            try:
+                return conditional(request, **kwargs)
+            except Http404:
+                return JsonResponse({'detail': 'Не найдено.'}, status=404)
+        return require_safe(wrapper)
+    return decorator
+
+
+def login_required(view):
+    @wraps(view)
+    def wrapper(request, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'detail': 'Нужна авторизация.'},
+                                status=401)
+        return view(request, **kwargs)
+    return wrapper
+
+
+@tagged(lambda request: ['feed'])
+def index(request):
+    page = paginate(request, project(Post.objects.all(), POST_FIELDS))
+    return page_response(request, page, serialize_post)
+
+
+@tagged(lambda request, slug: [f'group:{slug}'])
+def group_posts(request, slug):
+    if not Group.objects.filter(slug=slug).exists():
+        raise Http404
+    posts = Post.objects.filter(group__slug=slug)
+    page = paginate(request, project(posts, POST_FIELDS))
+    return page_response(request, page, serialize_post)
+
+
+@tagged(lambda request, username: [f'author:{username}'])
+def profile(request, username):
+    if not User.objects.filter(username=username).exists():
+        raise Http404
+    posts = Post.objects.filter(author__username=username)
+    page = paginate(request, project(posts, POST_FIELDS))
+    return page_response(request, page, serialize_post)
+
+
+@login_required
+@tagged(lambda request: cache_tags.follow_tags(request.user))
+def follow_index(request):
+    rows, sources = timeline.follow_feed(request.user)
+    page = paginate(
+        request, rows, ordering=timeline.FEED_ORDERING, sources=sources,
+        prepare=lambda rows: timeline.posts_for(
+            rows, project(Post.objects.all(), POST_FIELDS)),
+    )
+    return page_response(request, page, serialize_post)
+
+
+@tagged(lambda request, post_id: [f'post:{post_id}'])
+def post_detail(request, post_id):
+    row = project(Post.objects.filter(pk=post_id), POST_FIELDS).first()
+    if row is None:
+        raise Http404
+    return JsonResponse(serialize_post(row))
+
+
+@tagged(lambda request, post_id: [f'post:{post_id}'])
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    comments = Comment.objects.filter(post_id=post_id)
+    page = paginate(request, project(comments, COMMENT_FIELDS),
+                    ordering=('-created', '-id'))
+    return page_response(request, page, serialize_comment)
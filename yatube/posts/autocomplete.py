@@ -0,0 +1,186 @@
+"""Автодополнение имён авторов и сообществ по префиксу.
+
+Индекс — отсортированный список ``(ключ, тип, значение, подпись)``
+в памяти процесса; префикс ищется бинарным поиском, база при этом
+не используется. Индекс строится при старте воркера (``warm``) или
+при первом запросе, дальше меняется точечно.
+
+Изменения (``publish``) — пары «убрать/добавить строки» — пишутся в
+журнал в общем кэше тегов под номерами из счётчика в базе
+(``AutocompleteSequence``): ``incr`` файлового кэша не атомарен, два
+воркера получали бы один номер, и одно из изменений терялось. Каждый
+воркер помнит номер последнего применённого изменения и перед поиском
+дочитывает новые. Если изменения в журнале уже нет или оно требует
+полной пересборки (``invalidate``, например после импорта), индекс
+строится заново по базе.
+"""
+import threading
+from bisect import bisect_left, insort
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F
+
+from . import cache_tags
+from .models import AutocompleteSequence, Group, User
+
+HEAD_KEY = 'autocomplete:head'
+CHANGE_KEY = 'autocomplete:change:{}'
+CHANGE_TTL = 24 * 60 * 60
+
+_lock = threading.Lock()
+_entries = None
+_seq = None
+
+
+class PrefixIndex:
+    def __init__(self, entries=()):
+        self.entries = sorted(entries)
+
+    def add(self, entry):
+        position = bisect_left(self.entries, entry)
+        if self.entries[position:position + 1] != [entry]:
+            insort(self.entries, entry, lo=position)
+
+    def remove(self, entry):
+        position = bisect_left(self.entries, entry)
+        if self.entries[position:position + 1] == [entry]:
+            del self.entries[position]
+
+    def apply(self, change):
+        removed, added = change
+        for entry in removed:
+            self.remove(entry)
+        for entry in added:
+            self.add(entry)
+
+    def search(self, prefix, limit):
+        """Не больше ``limit`` различных совпадений по префиксу ключа."""
+        found = []
+        seen = set()
+        position = bisect_left(self.entries, (prefix,))
+        for key, kind, value, label in islice(self.entries, position, None):
+            if not key.startswith(prefix) or len(found) >= limit:
+                break
+            if (kind, value) in seen:
+                continue
+            seen.add((kind, value))
+            found.append((kind, value, label))
+        return found
+
+
+def normalize(text):
+    return text.casefold()
+
+
+def user_entries(username):
+    return [(normalize(username), 'user', username, username)]
+
+
+def group_entries(slug, title):
+    keys = {normalize(slug), normalize(title)}
+    keys.update(normalize(word) for word in title.split())
+    return [(key, 'group', slug, title) for key in keys if key]
+
+
+def load():
+    entries = []
+    for username in User.objects.filter(
+        is_active=True
+    ).values_list('username', flat=True).iterator():
+        entries.extend(user_entries(username))
+    for slug, title in Group.objects.values_list('slug', 'title'):
+        entries.extend(group_entries(slug, title))
+    return PrefixIndex(entries)
+
+
+def _head():
+    return cache_tags.store().get(HEAD_KEY, 0)
+
+
+def warm():
+    """Строит индекс заново по базе."""
+    global _entries, _seq
+    # Номер берётся до чтения базы: изменения, записанные во время
+    # загрузки, применятся повторно, а add и remove идемпотентны
+    seq = _head()
+    index = load()
+    with _lock:
+        _entries, _seq = index, seq
+    return index
+
+
+def _changes(since, head):
+    keys = [CHANGE_KEY.format(number)
+            for number in range(since + 1, head + 1)]
+    found = cache_tags.store().get_many(keys)
+    # None — изменение выпало из кэша или требует пересборки
+    changes = [found.get(key) for key in keys]
+    return None if None in changes else changes
+
+
+def get_index():
+    """Индекс процесса, догнавший журнал изменений."""
+    global _seq
+    head = _head()
+    with _lock:
+        index, seq = _entries, _seq
+        if index is not None and seq != head:
+            changes = _changes(seq, head) if seq < head else None
+            if changes is None:
+                index = None
+            else:
+                for change in changes:
+                    index.apply(change)
+                _seq = head
+    if index is None:
+        index = warm()
+    return index
+
+
+def _append(change):
+    store = cache_tags.store()
+    with transaction.atomic():
+        AutocompleteSequence.objects.get_or_create(pk=1)
+        counter = AutocompleteSequence.objects.filter(pk=1)
+        # UPDATE блокирует строку до конца транзакции: номера выдаются
+        # по одному, и голова журнала в кэше не откатывается назад
+        counter.update(value=F('value') + 1)
+        seq = counter.values_list('value', flat=True).get()
+        # Номер из отменённой транзакции уже мог попасть в журнал
+        head = store.get(HEAD_KEY, 0)
+        if head >= seq:
+            seq = head + 1
+            counter.update(value=seq)
+        store.set(CHANGE_KEY.format(seq), change, CHANGE_TTL)
+        store.set(HEAD_KEY, seq, None)
+    return seq
+
+
+def publish(removed=(), added=()):
+    """Убирает и добавляет строки индекса во всех процессах."""
+    global _seq
+    removed, added = list(removed), list(added)
+    if set(removed) == set(added):
+        return
+    change = (removed, added)
+    seq = _append(change)
+    with _lock:
+        if _entries is not None and _seq == seq - 1:
+            _entries.apply(change)
+            _seq = seq
+
+
+def invalidate():
+    """Индекс будет построен заново во всех процессах."""
+    global _entries
+    with _lock:
+        _entries = None
+    _append(None)
+
+
+def search(query, limit):
+    prefix = normalize(query.strip())
+    if not prefix:
+        return []
+    return get_index().search(prefix, limit)
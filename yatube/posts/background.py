@@ -0,0 +1,80 @@
+"""Фоновые задачи вне цикла запроса.
+
+Задачи выполняются в ограниченном пуле потоков; задача с тем же ключом,
+уже стоящая в очереди, повторно не ставится, а при переполнении очереди
+новые задачи отбрасываются. Тяжёлая обработка картинок уходит из
+потоков в пул процессов.
+"""
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_threads = None
+_processes = None
+_pending = set()
+
+
+def _run(key, func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой', key)
+    finally:
+        with _lock:
+            _pending.discard(key)
+        connections.close_all()
+
+
+def submit(key, func, *args):
+    global _threads
+    with _lock:
+        if key in _pending:
+            return
+        if len(_pending) >= settings.BACKGROUND_QUEUE_SIZE:
+            logger.warning('Очередь фоновых задач заполнена, пропускаем %s',
+                           key)
+            return
+        _pending.add(key)
+        if _threads is None:
+            _threads = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS,
+                thread_name_prefix='background',
+            )
+    _threads.submit(_run, key, func, args)
+
+
+def wait(timeout=None):
+    """Ждёт, пока выполнятся все поставленные задачи; True, если дождались."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        with _lock:
+            if not _pending:
+                return True
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+
+
+def on_commit(key, func, *args):
+    """Ставит задачу в очередь после коммита текущей транзакции."""
+    transaction.on_commit(partial(submit, key, func, *args))
+
+
+def process_pool():
+    global _processes
+    with _lock:
+        if _processes is None:
+            _processes = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _processes
@@ -0,0 +1,174 @@
+"""Версии кэшируемых данных, сгруппированные по тегам.
+
+Каждый тег (``feed``, ``follow:<id>`` и т. п.) хранит в кэше число —
+момент последней записи в его области в миллисекундах. Версии входят
+в ключи кэша, поэтому запись инвалидирует ровно те фрагменты, которые
+от неё зависят, а время жизни кэша можно держать большим.
+
+Версии лежат в кэше ``CACHE_TAGS_ALIAS``, общем для всех процессов:
+``bump`` в одном воркере сразу меняет ключи, ETag и Last-Modified во
+всех остальных. Сами фрагменты могут жить в локальном кэше процесса.
+Если общего хранилища нет (``LocMemCache``), проверка ``posts.W001``
+предупреждает, что развёртывание должно быть однопроцессным.
+"""
+import datetime
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Tags, Warning, register
+from django.utils import timezone
+
+from .models import User
+
+VERSION_KEY = 'posts:tag:{}'
+VERSION_TTL = None
+
+
+LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def store():
+    return caches[settings.CACHE_TAGS_ALIAS]
+
+
+@register(Tags.caches)
+def check_shared_store(app_configs, **kwargs):
+    backend = settings.CACHES[settings.CACHE_TAGS_ALIAS]['BACKEND']
+    if backend not in LOCAL_BACKENDS:
+        return []
+    return [Warning(
+        'Версии тегов хранятся в памяти процесса.',
+        hint='Другие воркеры не увидят записи до истечения кэша; '
+             'укажите общий бэкенд в CACHES[CACHE_TAGS_ALIAS] или '
+             'запускайте один процесс с коротким FRAGMENT_CACHE_TTL.',
+        id='posts.W001',
+    )]
+
+
+def _now():
+    return int(time.time() * 1000)
+
+
+def versions(*tags):
+    """Текущие версии тегов в том же порядке."""
+    keys = [VERSION_KEY.format(tag) for tag in tags]
+    found = store().get_many(keys)
+    missing = {key: _now() for key in keys if key not in found}
+    if missing:
+        # Версия потерянного тега всегда новее старых ключей
+        store().set_many(missing, VERSION_TTL)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+# Теги, которые сдвигают и записи, не меняющие набор строк страницы
+ROW_TAG_PREFIXES = ('feed', 'group:', 'author:')
+
+
+def row_tag(tag):
+    """Тег записей, меняющих сами строки страниц с тегом ``tag``.
+
+    Комментарий сдвигает ``feed``, ``group:`` и ``author:`` ради
+    счётчика на карточке поста, но постов на этих страницах не меняет.
+    По таким тегам ``posts.routers`` решает, могла ли реплика отстать.
+    """
+    if tag.startswith(ROW_TAG_PREFIXES):
+        return f'rows:{tag}'
+    return tag
+
+
+def bump(*tags, rows=True):
+    """Отмечает запись в области тегов.
+
+    ``rows=False`` — запись меняет только счётчики на страницах тегов,
+    а не их строки; см. ``row_tag``.
+    """
+    if rows:
+        tags = dict.fromkeys([*tags, *map(row_tag, tags)])
+    keys = [VERSION_KEY.format(tag) for tag in tags]
+    current = store().get_many(keys)
+    now = _now()
+    store().set_many(
+        {key: max(now, current.get(key, 0) + 1) for key in keys},
+        VERSION_TTL,
+    )
+
+
+def fragment_key(request, *tags):
+    """Ключ фрагмента: версии тегов, параметры страницы и пользователь."""
+    parts = [str(version) for version in versions(*tags)]
+    parts.append(request.GET.urlencode())
+    parts.append(str(request.user.pk))
+    return hashlib.md5(':'.join(parts).encode()).hexdigest()
+
+
+def follow_tags(user):
+    """Теги ленты подписок: подписки читателя и каждый его автор.
+
+    Запись автора, на которого читатель не подписан, ленту не трогает.
+    """
+    authors = User.objects.filter(following__user=user).values_list(
+        'username', flat=True)
+    return [f'follow:{user.pk}',
+            *(f'author:{username}' for username in authors)]
+
+
+def page_tags(view_name, kwargs):
+    """Теги, от которых зависит страница, или None, если её не кэшируем."""
+    if view_name == 'index':
+        return ['feed']
+    # Окно «активных авторов» сообществ сдвигается каждый день
+    today = f'day:{timezone.localdate().isoformat()}'
+    if view_name == 'groups':
+        return ['feed', today]
+    if view_name == 'group':
+        return [f'group:{kwargs["slug"]}', today]
+    if view_name in ('profile', 'followers', 'following'):
+        return [f'author:{kwargs["username"]}']
+    if view_name in ('trending', 'group_trending'):
+        # Рейтинг меняет update(), тексты и комментарии постов — лента
+        return ['trending', 'feed']
+    if view_name in ('post', 'post_comments'):
+        return [f'post:{kwargs["post_id"]}',
+                f'author:{kwargs["username"]}']
+    return None
+
+
+def request_tags(request):
+    """Теги HTML-страницы запроса с учётом пользователя или None."""
+    match = request.resolver_match
+    if match is None:
+        return None
+    if match.view_name == 'follow_index':
+        return follow_tags(request.user)
+    tags = page_tags(match.view_name, match.kwargs)
+    if tags is not None and request.user.is_authenticated:
+        # Кнопки подписки зависят от подписок читателя
+        tags.append(f'follow:{request.user.pk}')
+    return tags
+
+
+def page_etag(request, *args, **kwargs):
+    tags = request_tags(request)
+    if tags is None:
+        return None
+    return fragment_key(request, *tags)
+
+
+def modified_at(*tags):
+    """Время последней записи в области тегов."""
+    return datetime.datetime.fromtimestamp(
+        max(versions(*tags)) / 1000, tz=datetime.timezone.utc
+    )
+
+
+def page_last_modified(request, *args, **kwargs):
+    tags = request_tags(request)
+    if tags is None:
+        return None
+    return modified_at(*tags)
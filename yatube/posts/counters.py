@@ -0,0 +1,116 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserStats
+
+
+def count_of(model, field):
+    """Подзапрос с количеством строк ``model``, ссылающихся на запись."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field)
+        .annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def recount_user(user_id):
+    """Пересчитывает счётчики пользователя по исходным таблицам."""
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'posts': Post.objects.filter(author_id=user_id).count(),
+            'followers': Follow.objects.filter(author_id=user_id).count(),
+            'following': Follow.objects.filter(user_id=user_id).count(),
+        },
+    )
+    return stats
+
+
+def user_stats(user):
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return recount_user(user.pk)
+
+
+def bump_user(user_id, field, delta):
+    """Атомарно сдвигает счётчик пользователя на ``delta``.
+
+    Если строки счётчиков ещё нет, при увеличении она создаётся
+    пересчётом; при уменьшении отсутствующая строка (например, при
+    каскадном удалении самого пользователя) пропускается.
+    """
+    rows = UserStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        rows = rows.filter(**{f'{field}__gte': -delta})
+    with transaction.atomic():
+        updated = rows.update(**{field: F(field) + delta})
+        if not updated and delta > 0:
+            recount_user(user_id)
+
+
+def bump_comments(post_id, delta):
+    rows = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        rows = rows.filter(comment_count__gte=-delta)
+    rows.update(comment_count=F('comment_count') + delta)
+
+
+def reconcile_users(batch_size):
+    """Исправляет расхождения счётчиков пользователей пачками.
+
+    Возвращает количество исправленных строк.
+    """
+    fixed = 0
+    last_id = 0
+    while True:
+        rows = list(
+            User.objects.filter(pk__gt=last_id).order_by('pk')
+            .annotate(real_posts=count_of(Post, 'author'),
+                      real_followers=count_of(Follow, 'author'),
+                      real_following=count_of(Follow, 'user'))
+            .values('pk', 'real_posts', 'real_followers',
+                    'real_following')[:batch_size]
+        )
+        if not rows:
+            return fixed
+        current = UserStats.objects.in_bulk([row['pk'] for row in rows])
+        changed, missing = [], []
+        for row in rows:
+            real = UserStats(user_id=row['pk'], posts=row['real_posts'],
+                             followers=row['real_followers'],
+                             following=row['real_following'])
+            stats = current.get(row['pk'])
+            if stats is None:
+                missing.append(real)
+            elif (stats.posts, stats.followers, stats.following) != (
+                    real.posts, real.followers, real.following):
+                changed.append(real)
+        with transaction.atomic():
+            UserStats.objects.bulk_create(missing, ignore_conflicts=True)
+            UserStats.objects.bulk_update(
+                changed, ['posts', 'followers', 'following'])
+        fixed += len(changed) + len(missing)
+        last_id = rows[-1]['pk']
+
+
+def reconcile_posts(batch_size):
+    """Исправляет ``Post.comment_count`` пачками по ``batch_size`` постов."""
+    fixed = 0
+    last_id = 0
+    while True:
+        ids = list(
+            Post.objects.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return fixed
+        with transaction.atomic():
+            fixed += (
+                Post.objects.filter(pk__in=ids)
+                .annotate(real=count_of(Comment, 'post'))
+                .exclude(comment_count=F('real'))
+                .update(comment_count=count_of(Comment, 'post'))
+            )
+        last_id = ids[-1]
@@ -0,0 +1,135 @@
+"""RSS и Atom для общей ленты, сообществ и авторов.
+
+Лента содержит ``FEED_ITEMS`` последних постов. Готовый ответ хранится
+в кэше под версиями тегов (как страницы для анонимов), а ETag и
+Last-Modified считаются по тем же версиям, поэтому опрос без новых
+постов отвечает 304 без запросов к базе.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.views.decorators.http import condition
+
+from . import cache_tags
+from .models import Group, Post, User
+
+FEED_KEY = 'posts:feed:{}'
+
+
+class LatestPostsFeed(Feed):
+    title = 'Yatube: последние записи'
+    description = 'Новые записи всех авторов'
+
+    def link(self):
+        return reverse('index')
+
+    def posts(self, obj):
+        return Post.objects.all()
+
+    def items(self, obj):
+        return (
+            self.posts(obj).select_related('author', 'group')
+            .order_by('-pub_date', '-id')[:settings.FEED_ITEMS]
+        )
+
+    def item_title(self, item):
+        return f'@{item.author.username}: {item.text[:50]}'
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse('post', args=[item.author.username, item.pk])
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+
+class GroupPostsFeed(LatestPostsFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, obj):
+        return f'Yatube: {obj.title}'
+
+    def description(self, obj):
+        return obj.description
+
+    def link(self, obj):
+        return reverse('group', args=[obj.slug])
+
+    def posts(self, obj):
+        return obj.posts.all()
+
+
+class ProfilePostsFeed(LatestPostsFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, obj):
+        return f'Yatube: записи @{obj.username}'
+
+    def description(self, obj):
+        return f'Новые записи автора @{obj.username}'
+
+    def link(self, obj):
+        return reverse('profile', args=[obj.username])
+
+    def posts(self, obj):
+        return obj.posts.all()
+
+
+def atom(feed_class):
+    """Atom-вариант ленты; подзаголовок берётся из описания RSS."""
+    return type(f'Atom{feed_class.__name__}', (feed_class,), {
+        'feed_type': Atom1Feed,
+        'subtitle': feed_class.description,
+    })
+
+
+def feed_tags(slug=None, username=None):
+    if slug is not None:
+        return [f'group:{slug}']
+    if username is not None:
+        return [f'author:{username}']
+    return ['feed']
+
+
+def feed_etag(request, **kwargs):
+    parts = [str(version) for version in
+             cache_tags.versions(*feed_tags(**kwargs))]
+    parts.append(request.path)
+    return hashlib.md5(':'.join(parts).encode()).hexdigest()
+
+
+def feed_last_modified(request, **kwargs):
+    return cache_tags.modified_at(*feed_tags(**kwargs))
+
+
+def cached(feed):
+    """Представление ленты с кэшем ответа и условным GET."""
+    @condition(etag_func=feed_etag, last_modified_func=feed_last_modified)
+    def view(request, **kwargs):
+        key = FEED_KEY.format(feed_etag(request, **kwargs))
+        response = cache.get(key)
+        if response is None:
+            response = feed(request, **kwargs)
+            cache.set(key, response, settings.FEED_CACHE_TTL)
+        return response
+    return view
+
+
+index_rss = cached(LatestPostsFeed())
+index_atom = cached(atom(LatestPostsFeed)())
+group_rss = cached(GroupPostsFeed())
+group_atom = cached(atom(GroupPostsFeed)())
+profile_rss = cached(ProfilePostsFeed())
+profile_atom = cached(atom(ProfilePostsFeed)())
@@ -1,9 +1,43 @@
+import os
+
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
 
+from . import imaging
 from .models import Comment, Post
 
 
 class PostForm(forms.ModelForm):
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_errors = upload_errors or {}
+
+    def clean_image(self):
+        if 'image' in self.upload_errors:
+            raise forms.ValidationError(self.upload_errors['image'])
+        image = self.cleaned_data.get('image')
+        if not image or not hasattr(image, 'content_type'):
+            return image
+        image.seek(0)
+        try:
+            normalized = imaging.normalize(
+                image,
+                max_edge=settings.POST_IMAGE_MAX_EDGE,
+                max_pixels=settings.POST_IMAGE_MAX_PIXELS,
+                quality=settings.POST_IMAGE_INGEST_QUALITY,
+            )
+        except (imaging.ImageRejected, Image.DecompressionBombError):
+            raise forms.ValidationError('Слишком большое изображение.')
+        if normalized is None:
+            image.seek(0)
+            return image
+        data, fmt = normalized
+        name = os.path.basename(image.name)
+        return SimpleUploadedFile(name, data,
+                                  content_type=Image.MIME.get(fmt))
+
     class Meta:
         model = Post
         fields = ['text', 'group', 'image']
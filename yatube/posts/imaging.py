@@ -0,0 +1,75 @@
+"""Обработка картинок на Pillow без зависимостей от Django.
+
+Функции модуля выполняются в отдельных процессах, поэтому получают
+и возвращают только простые значения.
+"""
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+
+def supported_formats(preferred):
+    """Форматы из ``preferred``, которые установленный Pillow умеет писать."""
+    Image.init()
+    return [fmt for fmt in preferred if fmt.upper() in Image.SAVE]
+
+
+def render_variants(source_path, target_dir, stem, widths, aspect,
+                    formats, quality):
+    """Нарезает картинку под пропорции ``aspect`` в нескольких ширинах.
+
+    Ширины больше исходной пропускаются. Возвращает список
+    ``(формат, ширина, высота, имя файла)``.
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    rendered = []
+    with Image.open(source_path) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info
+                                  else 'RGB')
+        fitting = [width for width in widths if width <= image.width]
+        for width in fitting or [image.width]:
+            height = max(1, round(width * aspect[1] / aspect[0]))
+            resized = ImageOps.fit(image, (width, height), Image.LANCZOS)
+            for fmt in formats:
+                name = f'{stem}-{width}.{fmt}'
+                resized.save(os.path.join(target_dir, name), fmt.upper(),
+                             quality=quality)
+                rendered.append((fmt, width, height, name))
+    return rendered
+
+
+class ImageRejected(ValueError):
+    pass
+
+
+def normalize(fileobj, max_edge, max_pixels, quality):
+    """Уменьшает картинку до ``max_edge`` по большей стороне и убирает EXIF.
+
+    Размер проверяется по заголовку, до декодирования; JPEG декодируется
+    сразу в уменьшенном масштабе (``draft``). Возвращает ``(данные,
+    формат)`` или None, если картинку можно сохранить как есть
+    (она не больше лимита, без EXIF или анимирована). Снимки телефонов
+    в MPO — это JPEG с дополнительными кадрами: от них остаётся первый
+    кадр в JPEG.
+    """
+    with Image.open(fileobj) as image:
+        width, height = image.size
+        if width * height > max_pixels:
+            raise ImageRejected(f'{width}x{height}')
+        fmt = 'JPEG' if image.format == 'MPO' else image.format
+        oversized = max(width, height) > max_edge
+        if fmt != 'JPEG' and getattr(image, 'is_animated', False):
+            return None
+        if not oversized and 'exif' not in image.info:
+            return None
+        if fmt == 'JPEG':
+            image.draft('RGB', (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        options = {'quality': quality} if fmt in ('JPEG', 'WEBP') else {}
+        buffer = BytesIO()
+        image.save(buffer, fmt, **options)
+    return buffer.getvalue(), fmt
@@ -0,0 +1,358 @@
+"""Массовая загрузка постов, комментариев и подписок.
+
+Записи читаются потоком (JSONL или CSV), копятся в буферах по видам
+и вставляются пачками (``insert_raw`` и ``bulk_create``), каждая
+пачка — в своей транзакции. Авторы и группы ищутся одним запросом на пачку и
+запоминаются. Посты получают новые ключи внутри транзакции пачки
+после текущего MAX(id), чтобы не столкнуться с постами, которые сайт
+создал во время загрузки. ``id`` поста из файла запоминается в
+``ImportedPost``: через него комментарии находят свой пост, а
+повторная загрузка пропускает уже загруженные. Записи с битым JSON,
+ключом или датой считаются ошибками и пропускаются.
+
+Пакетная вставка не вызывает сигналы, поэтому счётчики, ленты и теги
+кэша страниц обновляются здесь же после каждой пачки, а с
+``defer=True`` — один раз в конце вместе с перестройкой
+полнотекстовых индексов.
+"""
+import csv
+import json
+from collections import Counter
+
+from django.contrib.auth.hashers import make_password
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import (autocomplete, cache_tags, counters, rollups, search,
+               timeline)
+from .models import Comment, Follow, Group, ImportedPost, Post, User
+
+KINDS = ('post', 'comment', 'follow')
+
+
+def read_records(stream, fmt, kind=None):
+    """Записи из потока; в CSV вид берётся из колонки ``type`` или ``kind``.
+
+    Вместо строки JSONL, которая не разбирается в объект, выдаётся None.
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            record = {name: value for name, value in row.items() if value}
+            record.setdefault('type', kind)
+            yield record
+        return
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict):
+            yield None
+            continue
+        record.setdefault('type', kind)
+        yield record
+
+
+def parse_id(value):
+    number = int(value)
+    if not -2 ** 63 <= number < 2 ** 63:
+        raise ValueError(f'Некорректный id: {value}')
+    return number
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f'Некорректная дата: {value}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.utc)
+    return parsed
+
+
+def insert_raw(model, objs, batch_size):
+    """Вставляет объекты как есть, без ``pre_save`` полей.
+
+    ``bulk_create`` заменил бы даты из файла в полях с ``auto_now_add``
+    на текущее время; здесь, как в ``loaddata``, значения пишутся сырыми,
+    а поля модели не меняются. Ключ, если он не задан, назначает база.
+    """
+    if not objs:
+        return
+    fields = [field for field in model._meta.concrete_fields
+              if not (field.primary_key and objs[0].pk is None)]
+    connection = connections[router.db_for_write(model)]
+    size = min(batch_size, connection.ops.bulk_batch_size(fields, objs))
+    for start in range(0, len(objs), size):
+        model._base_manager._insert(objs[start:start + size], fields=fields,
+                                    raw=True, using=connection.alias)
+
+
+class Importer:
+    def __init__(self, batch_size, create_missing=False, defer=False):
+        self.batch_size = batch_size
+        self.create_missing = create_missing
+        self.defer = defer
+        self.users = {}
+        self.groups = {}
+        self.posts = {}
+        self.buffers = {kind: [] for kind in KINDS}
+        self.stats = Counter()
+        self.progress = None
+        self.tags = set()
+
+    def add(self, record):
+        if record is None:
+            self.stats['errors'] += 1
+            return
+        buffer = self.buffers.get(record.get('type'))
+        if buffer is None:
+            self.stats['skipped'] += 1
+            return
+        buffer.append(record)
+        if len(buffer) >= self.batch_size:
+            self.flush()
+
+    def run(self, records, progress=None):
+        """Загружает все записи; ``progress`` вызывается после пачек."""
+        self.progress = progress
+        if self.defer:
+            search.suspend_sync()
+        try:
+            for record in records:
+                self.add(record)
+            self.flush()
+        finally:
+            if self.defer:
+                self.maintain()
+            self.bump()
+        autocomplete.invalidate()
+        return self.stats
+
+    def flush(self):
+        with transaction.atomic():
+            self.insert_posts(self.take('post'))
+            self.insert_comments(self.take('comment'))
+            self.insert_follows(self.take('follow'))
+        if not self.defer:
+            self.bump()
+        if self.progress is not None:
+            self.progress(self.stats)
+
+    def take(self, kind):
+        records, self.buffers[kind] = self.buffers[kind], []
+        return records
+
+    def bump(self):
+        """Инвалидирует ленты и страницы авторов, групп и постов пачек."""
+        cache_tags.bump('feed', *self.tags)
+        self.tags.clear()
+
+    def maintain(self):
+        """Отложенное обслуживание: индексы, ленты и счётчики целиком."""
+        search.resume_sync()
+        timeline.rebuild()
+        counters.reconcile_users(self.batch_size)
+        counters.reconcile_posts(self.batch_size)
+        rollups.rebuild()
+
+    def resolve_users(self, usernames):
+        missing = set(filter(None, usernames)) - set(self.users)
+        if not missing:
+            return
+        self.users.update(
+            User.objects.filter(username__in=missing)
+            .values_list('username', 'id')
+        )
+        missing -= set(self.users)
+        if missing and self.create_missing:
+            password = make_password(None)
+            User.objects.bulk_create(
+                [User(username=name, password=password) for name in missing],
+                ignore_conflicts=True,
+            )
+            self.users.update(
+                User.objects.filter(username__in=missing)
+                .values_list('username', 'id')
+            )
+            self.stats['users'] += len(missing)
+
+    def resolve_groups(self, slugs):
+        missing = set(filter(None, slugs)) - set(self.groups)
+        if not missing:
+            return
+        self.groups.update(
+            Group.objects.filter(slug__in=missing).values_list('slug', 'id')
+        )
+        missing -= set(self.groups)
+        if missing and self.create_missing:
+            Group.objects.bulk_create(
+                [Group(slug=slug, title=slug, description='')
+                 for slug in missing],
+                ignore_conflicts=True,
+            )
+            self.groups.update(
+                Group.objects.filter(slug__in=missing)
+                .values_list('slug', 'id')
+            )
+            self.stats['groups'] += len(missing)
+
+    def parse(self, records, convert):
+        """Пары ``(запись, convert(запись))``; ошибки разбора считаются."""
+        parsed = []
+        for record in records:
+            try:
+                parsed.append((record, convert(record)))
+            except ValueError:
+                self.stats['errors'] += 1
+        return parsed
+
+    def resolve_posts(self, source_ids):
+        """Ключи на сайте для ``id`` постов из файла."""
+        missing = set(source_ids) - set(self.posts)
+        if missing:
+            self.posts.update(
+                ImportedPost.objects.filter(source_id__in=missing)
+                .values_list('source_id', 'post_id')
+            )
+
+    def insert_posts(self, records):
+        if not records:
+            return
+        parsed = self.parse(records, lambda record: (
+            parse_id(record['id']) if record.get('id') else None,
+            parse_date(record.get('pub_date')),
+        ))
+        self.resolve_users(record.get('author') for record, _ in parsed)
+        self.resolve_groups(
+            record['group'] for record, _ in parsed if record.get('group')
+        )
+        self.resolve_posts(
+            source_id for _, (source_id, _) in parsed if source_id is not None
+        )
+        # Внутри транзакции пачки: посты сайта могли появиться только что
+        next_id = (Post.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        posts = []
+        links = []
+        for record, (source_id, pub_date) in parsed:
+            author_id = self.users.get(record.get('author'))
+            group_id = self.groups.get(record.get('group'))
+            if author_id is None or record.get('group') and group_id is None:
+                self.stats['errors'] += 1
+                continue
+            if source_id in self.posts:
+                self.stats['duplicates'] += 1
+                continue
+            pk, next_id = next_id, next_id + 1
+            if source_id is not None:
+                self.posts[source_id] = pk
+                links.append(ImportedPost(source_id=source_id, post_id=pk))
+            posts.append(Post(
+                id=pk, text=record.get('text', ''), author_id=author_id,
+                group_id=group_id, image=record.get('image', ''),
+                pub_date=pub_date,
+            ))
+            self.tags.add(f'author:{record["author"]}')
+            if record.get('group'):
+                self.tags.add(f'group:{record["group"]}')
+        insert_raw(Post, posts, self.batch_size)
+        ImportedPost.objects.bulk_create(links, batch_size=self.batch_size)
+        self.stats['posts'] += len(posts)
+        if self.defer:
+            return
+        for author_id, count in Counter(
+                post.author_id for post in posts).items():
+            counters.bump_user(author_id, 'posts', count)
+        for post in posts:
+            timeline.fan_out(post)
+        rollups.recount({(post.group_id, rollups.day_of(post.pub_date))
+                         for post in posts if post.group_id})
+
+    def insert_comments(self, records):
+        if not records:
+            return
+        parsed = self.parse(records, lambda record: (
+            parse_id(record.get('post') or 0),
+            parse_date(record.get('created')),
+        ))
+        self.resolve_users(record.get('author') for record, _ in parsed)
+        self.resolve_posts(source_id for _, (source_id, _) in parsed)
+        posts = {
+            pk: (group_id, author, slug)
+            for pk, group_id, author, slug in Post.objects.filter(pk__in=[
+                self.posts[source_id] for _, (source_id, _) in parsed
+                if source_id in self.posts
+            ]).values_list('id', 'group_id', 'author__username',
+                           'group__slug')
+        }
+        post_groups = {pk: found[0] for pk, found in posts.items()}
+        comments = []
+        for record, (source_id, created) in parsed:
+            author_id = self.users.get(record.get('author'))
+            post_id = self.posts.get(source_id)
+            if author_id is None or post_id not in posts:
+                self.stats['errors'] += 1
+                continue
+            comments.append(Comment(
+                post_id=post_id, author_id=author_id,
+                text=record.get('text', ''), created=created,
+            ))
+            _, author, slug = posts[post_id]
+            self.tags.update([f'post:{post_id}', f'author:{author}'])
+            if slug is not None:
+                self.tags.add(f'group:{slug}')
+        insert_raw(Comment, comments, self.batch_size)
+        self.stats['comments'] += len(comments)
+        if self.defer:
+            return
+        for post_id, count in Counter(
+                comment.post_id for comment in comments).items():
+            counters.bump_comments(post_id, count)
+        rollups.recount({
+            (post_groups[comment.post_id], rollups.day_of(comment.created))
+            for comment in comments if post_groups[comment.post_id]
+        })
+
+    def insert_follows(self, records):
+        if not records:
+            return
+        self.resolve_users(
+            name for record in records
+            for name in (record.get('user'), record.get('author'))
+        )
+        pairs = []
+        for record in records:
+            pair = (self.users.get(record.get('user')),
+                    self.users.get(record.get('author')))
+            if None in pair or pair[0] == pair[1]:
+                self.stats['errors'] += 1
+                continue
+            pairs.append(pair)
+            self.tags.update([f'follow:{pair[0]}',
+                              f'author:{record["user"]}',
+                              f'author:{record["author"]}'])
+        existing = set(Follow.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            author_id__in={author_id for _, author_id in pairs},
+        ).values_list('user_id', 'author_id'))
+        follows = []
+        for pair in pairs:
+            if pair in existing:
+                self.stats['duplicates'] += 1
+                continue
+            existing.add(pair)
+            follows.append(Follow(user_id=pair[0], author_id=pair[1]))
+        Follow.objects.bulk_create(follows, batch_size=self.batch_size)
+        self.stats['follows'] += len(follows)
+        if self.defer:
+            return
+        for follow in follows:
+            counters.bump_user(follow.author_id, 'followers', 1)
+            counters.bump_user(follow.user_id, 'following', 1)
+            timeline.backfill(follow.user_id, follow.author_id)
@@ -0,0 +1,185 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.db.models import F
+from django.test.utils import override_settings
+
+from posts import metrics
+from posts.models import Comment, Post, User
+from posts.routers import PRIMARY
+from posts.sqlite import atomic_with_retry, is_locked
+
+ALIAS = 'benchmark'
+SEED_POSTS = 200
+
+
+def profiles():
+    """Голая конфигурация Django и профиль ``production``."""
+    return {
+        'default': {
+            'pragmas': {}, 'options': {}, 'retries': 0, 'reuse': False,
+        },
+        'production': {
+            'pragmas': settings.SQLITE_PRODUCTION_PRAGMAS,
+            'options': {'timeout': settings.SQLITE_BUSY_TIMEOUT},
+            'retries': 5, 'reuse': True,
+        },
+    }
+
+
+def read_page(post_ids):
+    list(Post.objects.using(ALIAS).select_related('author', 'group')
+         .order_by('-pub_date')[:settings.PAGES])
+    Comment.objects.using(ALIAS).filter(
+        post_id=random.choice(post_ids)).count()
+
+
+def write_comment(post_id, author_id):
+    # Как add_comment: транзакция начинается чтением, затем запись
+    Post.objects.using(ALIAS).filter(pk=post_id).values('id').first()
+    Comment.objects.using(ALIAS).bulk_create([Comment(
+        post_id=post_id, author_id=author_id, text='benchmark',
+    )])
+    Post.objects.using(ALIAS).filter(pk=post_id).update(
+        comment_count=F('comment_count') + 1
+    )
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность чтения и записи SQLite '
+            'без настроек и в профиле production на копии основной базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Сколько потоков одновременно читают и пишут.',
+        )
+        parser.add_argument(
+            '--seconds', type=float, default=5,
+            help='Длительность прогона каждого профиля.',
+        )
+        parser.add_argument(
+            '--write-ratio', type=float, default=0.2,
+            help='Доля операций записи (комментариев).',
+        )
+        parser.add_argument(
+            '--profile', choices=('default', 'production', 'both'),
+            default='both',
+        )
+
+    def handle(self, *args, **options):
+        if connections[PRIMARY].vendor != 'sqlite':
+            raise CommandError('Сравнение поддерживается только для SQLite')
+        names = (('default', 'production') if options['profile'] == 'both'
+                 else (options['profile'],))
+        self.stdout.write('профиль     чтений/с  записей/с  блокировок  '
+                          'повторов')
+        for name in names:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'benchmark.sqlite3')
+                self.copy_primary(path)
+                stats = self.run_profile(profiles()[name], path, options)
+            seconds = options['seconds']
+            self.stdout.write(
+                f'{name:<11} {stats["reads"] / seconds:>8.0f}  '
+                f'{stats["writes"] / seconds:>9.0f}  '
+                f'{stats["errors"]:>10}  {stats["retries"]:>8.0f}'
+            )
+
+    def copy_primary(self, path):
+        """Свежая копия основной базы в режиме журнала по умолчанию."""
+        primary = connections[PRIMARY]
+        primary.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            primary.connection.backup(target)
+            target.execute('PRAGMA journal_mode = delete')
+        finally:
+            target.close()
+
+    def run_profile(self, profile, path, options):
+        connections.databases[ALIAS] = {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': path,
+            'OPTIONS': profile['options'],
+        }
+        stats = Counter()
+        lock = threading.Lock()
+        with override_settings(SQLITE_PRAGMAS=profile['pragmas'],
+                               SQLITE_WRITE_RETRIES=profile['retries']):
+            post_ids, user_ids = self.seed()
+            retries = metrics.snapshot()['counters'].get(
+                'db.write_retries', 0)
+            deadline = time.monotonic() + options['seconds']
+            workers = [
+                threading.Thread(target=self.work, args=(
+                    deadline, options['write_ratio'], post_ids, user_ids,
+                    profile['reuse'], stats, lock,
+                ))
+                for _ in range(options['workers'])
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        stats['retries'] = metrics.snapshot()['counters'].get(
+            'db.write_retries', 0) - retries
+        del connections[ALIAS]
+        del connections.databases[ALIAS]
+        return stats
+
+    def seed(self):
+        """Идентификаторы постов и авторов; пустую копию заполняет.
+
+        Заполнение идёт через ``bulk_create``: сигналы писали бы
+        счётчики и кэш в основную базу.
+        """
+        posts = Post.objects.using(ALIAS)
+        if not posts.exists():
+            users = User.objects.using(ALIAS)
+            users.bulk_create([User(username='benchmark')],
+                              ignore_conflicts=True)
+            author_id = users.get(username='benchmark').pk
+            posts.bulk_create([Post(text=f'Пост {number}',
+                                    author_id=author_id)
+                               for number in range(SEED_POSTS)])
+        post_ids = list(posts.values_list('id', flat=True)[:1000])
+        user_ids = list(User.objects.using(ALIAS)
+                        .values_list('id', flat=True)[:1000])
+        connections[ALIAS].close()
+        return post_ids, user_ids
+
+    def work(self, deadline, write_ratio, post_ids, user_ids, reuse, stats,
+             lock):
+        done = Counter()
+        try:
+            while time.monotonic() < deadline:
+                writing = random.random() < write_ratio
+                try:
+                    if writing:
+                        atomic_with_retry(
+                            write_comment, random.choice(post_ids),
+                            random.choice(user_ids), using=ALIAS,
+                        )
+                    else:
+                        read_page(post_ids)
+                except OperationalError as error:
+                    if not is_locked(error):
+                        raise
+                    done['errors'] += 1
+                else:
+                    done['writes' if writing else 'reads'] += 1
+                if not reuse:
+                    # Без CONN_MAX_AGE соединение открывается на запрос
+                    connections[ALIAS].close()
+        finally:
+            connections[ALIAS].close()
+            with lock:
+                stats.update(done)
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает предложения «на кого подписаться» по графу '
+            'подписок. Запускается периодически.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.SUGGESTIONS_BATCH_SIZE,
+            help='Сколько читателей считать за один шаг.',
+        )
+        parser.add_argument(
+            '--top-k', type=int, default=settings.SUGGESTIONS_TOP_K,
+            help='Сколько предложений хранить для читателя.',
+        )
+
+    def handle(self, *args, **options):
+        written = suggestions.build(batch_size=options['batch_size'],
+                                    top_k=options['top_k'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Предложения пересчитаны, строк: {written}'
+        ))
@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты и комментарии пользователя потоком.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            '--format', choices=export.FORMATS, default='jsonl',
+            help='jsonl, csv или zip с картинками постов.',
+        )
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл для выгрузки; по умолчанию stdout.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(
+                f'Пользователь {options["username"]} не найден'
+            )
+        fmt = options['format']
+        binary = fmt == 'zip'
+        if options['output'] == '-':
+            for chunk in export.stream(user, fmt):
+                if binary:
+                    sys.stdout.buffer.write(chunk)
+                else:
+                    self.stdout.write(chunk, ending='')
+            return
+        mode = 'wb' if binary else 'w'
+        encoding = None if binary else 'utf-8'
+        newline = None if binary else ''
+        with open(options['output'], mode, encoding=encoding,
+                  newline=newline) as target:
+            for chunk in export.stream(user, fmt):
+                target.write(chunk)
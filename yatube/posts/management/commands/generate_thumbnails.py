@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+
+
+class Command(BaseCommand):
+    help = ('Строит недостающие миниатюры картинок постов: для старых '
+            'постов и для задач, отброшенных переполненной очередью.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов проверять за один шаг.',
+        )
+
+    def handle(self, *args, **options):
+        built = thumbnails.build_missing(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры построены для постов: {built}'
+        ))
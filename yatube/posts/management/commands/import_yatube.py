@@ -0,0 +1,72 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import importer
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты, комментарии и подписки из JSONL или CSV '
+            'пачками через bulk_create.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл с записями или «-» для чтения из stdin.',
+        )
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'), default=None,
+            help='Формат входа; по умолчанию — по расширению файла.',
+        )
+        parser.add_argument(
+            '--type', choices=importer.KINDS, default=None,
+            help='Вид записей, если в файле нет колонки type.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько записей вставлять в одной транзакции.',
+        )
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Создавать неизвестных авторов и группы.',
+        )
+        parser.add_argument(
+            '--defer', action='store_true',
+            help='Обновить поисковые индексы, ленты и счётчики один раз '
+                 'в конце, а не после каждой пачки.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv')
+                                    else 'jsonl')
+        loader = importer.Importer(
+            batch_size=options['batch_size'],
+            create_missing=options['create_missing'],
+            defer=options['defer'],
+        )
+        started = time.monotonic()
+
+        def progress(stats):
+            loaded = stats['posts'] + stats['comments'] + stats['follows']
+            rate = loaded / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(f'Загружено {loaded} ({rate:.0f} строк/с)')
+
+        try:
+            stream = (sys.stdin if path == '-'
+                      else open(path, encoding='utf-8', newline=''))
+        except OSError as error:
+            raise CommandError(error)
+        with stream:
+            stats = loader.run(
+                importer.read_records(stream, fmt, options['type']),
+                progress=progress if options['verbosity'] > 1 else None,
+            )
+        elapsed = time.monotonic() - started
+        loaded = stats['posts'] + stats['comments'] + stats['follows']
+        self.stdout.write(self.style.SUCCESS(
+            f'Постов: {stats["posts"]}, комментариев: {stats["comments"]}, '
+            f'подписок: {stats["follows"]}; пропущено: '
+            f'{stats["errors"] + stats["duplicates"] + stats["skipped"]}; '
+            f'{loaded / max(elapsed, 1e-6):.0f} строк/с'
+        ))
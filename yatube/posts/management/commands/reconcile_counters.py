@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters, rollups
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счётчики пользователей '
+            'и комментариев, дневные сводки сообществ и исправляет '
+            'расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк проверять в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        users = counters.reconcile_users(batch_size)
+        posts = counters.reconcile_posts(batch_size)
+        days = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: пользователей {users}, постов {posts}; '
+            f'сводки сообществ пересчитаны, дней: {days}'
+        ))
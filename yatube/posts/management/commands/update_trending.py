@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = ('Обновляет оценки популярных постов и сообществ: затухание '
+            'с прошлого запуска и новые события. Запускается периодически.')
+
+    def handle(self, *args, **options):
+        count = trending.update()
+        self.stdout.write(self.style.SUCCESS(
+            f'Популярное обновлено, постов в рейтинге: {count}'
+        ))
@@ -0,0 +1,58 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import Resolver404, resolve
+
+from . import cache_tags
+
+PAGE_KEY = 'posts:page:{}'
+
+
+class AnonymousPageCacheMiddleware:
+    """Кэширует страницы лент и постов для анонимных пользователей целиком.
+
+    Ключ строится из пути с параметрами и версий тегов страницы
+    (``cache_tags``), поэтому запись в группу, профиль или пост
+    инвалидирует только страницы, которые от неё зависят.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = self.cache_key(request)
+        if key is None:
+            return self.get_response(request)
+        response = cache.get(key)
+        if response is not None:
+            return response
+        response = self.get_response(request)
+        if self.is_cacheable(response):
+            cache.set(key, response, settings.ANONYMOUS_PAGE_CACHE_TTL)
+        return response
+
+    def cache_key(self, request):
+        if not settings.ANONYMOUS_PAGE_CACHE_TTL:
+            return None
+        if request.method != 'GET' or request.user.is_authenticated:
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        tags = cache_tags.page_tags(match.view_name, match.kwargs)
+        if tags is None:
+            return None
+        parts = [str(version) for version in cache_tags.versions(*tags)]
+        parts.append(request.get_full_path())
+        digest = hashlib.md5(':'.join(parts).encode()).hexdigest()
+        return PAGE_KEY.format(digest)
+
+    def is_cacheable(self, response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and 'private' not in response.get('Cache-Control', '')
+        )
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+TOKENIZER = "unicode61 remove_diacritics 2"
+
+
+def index_sql(table):
+    """FTS5-индекс с внешним содержимым и триггеры синхронизации."""
+    index = f'{table}_fts'
+    return [
+        f"CREATE VIRTUAL TABLE {index} USING fts5("
+        f"text, content='{table}', content_rowid='id', "
+        f"tokenize='{TOKENIZER}')",
+        f"CREATE TRIGGER {index}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {index}(rowid, text) VALUES (new.id, new.text); END",
+        f"CREATE TRIGGER {index}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {index}({index}, rowid, text) "
+        f"VALUES ('delete', old.id, old.text); END",
+        f"CREATE TRIGGER {index}_au AFTER UPDATE OF text ON {table} BEGIN "
+        f"INSERT INTO {index}({index}, rowid, text) "
+        f"VALUES ('delete', old.id, old.text); "
+        f"INSERT INTO {index}(rowid, text) VALUES (new.id, new.text); END",
+        f"INSERT INTO {index}({index}) VALUES ('rebuild')",
+    ]
+
+
+def drop_sql(table):
+    index = f'{table}_fts'
+    return [
+        f'DROP TRIGGER IF EXISTS {index}_ai',
+        f'DROP TRIGGER IF EXISTS {index}_ad',
+        f'DROP TRIGGER IF EXISTS {index}_au',
+        f'DROP TABLE IF EXISTS {index}',
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_imagevariant'),
+    ]
+
+    operations = [
+        migrations.RunSQL(index_sql('posts_post'), drop_sql('posts_post')),
+        migrations.RunSQL(index_sql('posts_comment'),
+                          drop_sql('posts_comment')),
+    ]
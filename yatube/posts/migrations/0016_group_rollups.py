@@ -0,0 +1,98 @@
+# Generated by Django 2.2.28 on 2026-10-18 04:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def fill_rollups(apps, schema_editor):
+    """Строит дневные сводки по уже опубликованным постам и комментариям."""
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    GroupDailyStats = apps.get_model('posts', 'GroupDailyStats')
+    GroupDailyAuthor = apps.get_model('posts', 'GroupDailyAuthor')
+    sources = (
+        ('posts', Post.objects.annotate(day=TruncDate('pub_date')),
+         'group_id'),
+        ('comments', Comment.objects.annotate(day=TruncDate('created')),
+         'post__group_id'),
+    )
+    stats = {}
+    authors = set()
+    for field, rows, group in sources:
+        rows = rows.filter(**{f'{group}__isnull': False}).order_by()
+        for group_id, day, total in rows.values_list(group, 'day').annotate(
+                total=Count('id')):
+            row = stats.setdefault((group_id, day), GroupDailyStats(
+                group_id=group_id, day=day))
+            setattr(row, field, total)
+        authors.update(rows.values_list(group, 'day', 'author_id').distinct())
+    for group_id, day, _ in authors:
+        stats[group_id, day].authors += 1
+    GroupDailyAuthor.objects.bulk_create(
+        [GroupDailyAuthor(group_id=group_id, day=day, author_id=author_id)
+         for group_id, day, author_id in authors],
+        batch_size=1000,
+    )
+    GroupDailyStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0015_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupDailyAuthor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GroupDailyStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Записей')),
+                ('comments', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+                ('authors', models.PositiveIntegerField(default=0, verbose_name='Авторов')),
+            ],
+            options={
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='posts_post_group_i_6a7ae9_idx'),
+        ),
+        migrations.AddField(
+            model_name='groupdailystats',
+            name='group',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='posts.Group'),
+        ),
+        migrations.AddField(
+            model_name='groupdailyauthor',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='groupdailyauthor',
+            name='group',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Group'),
+        ),
+        migrations.AddConstraint(
+            model_name='groupdailystats',
+            constraint=models.UniqueConstraint(fields=('group', 'day'), name='unique_group_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='groupdailyauthor',
+            constraint=models.UniqueConstraint(fields=('group', 'day', 'author'), name='unique_group_day_author'),
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.28 on 2026-10-18 05:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pulled(apps, schema_editor):
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(
+        followers__gt=settings.FEED_FANOUT_THRESHOLD
+    ).update(pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_imported_post'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='pulled',
+            field=models.BooleanField(default=False, verbose_name='Режим чтения'),
+        ),
+        migrations.RunPython(mark_pulled, migrations.RunPython.noop),
+    ]
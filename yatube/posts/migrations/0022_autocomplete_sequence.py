@@ -0,0 +1,20 @@
+# Generated by Django 2.2.28 on 2026-10-18 05:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_comment_post_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AutocompleteSequence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -4,6 +4,19 @@ from django.db import models
 User = get_user_model()
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Всё, что нужно карточке поста, одним запросом.
+
+        Автор и группа подтягиваются JOIN-ом, количество комментариев
+        хранится в самом посте (``comment_count``), варианты картинок
+        загружаются одним запросом на всю страницу.
+        """
+        return self.select_related('author', 'group').prefetch_related(
+            'image_variants'
+        )
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True,
@@ -13,9 +26,21 @@ class Post(models.Model):
     group = models.ForeignKey('Group', on_delete=models.SET_NULL, blank=True,
                               null=True, related_name='posts')
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    comment_count = models.PositiveIntegerField(
+        'Количество комментариев', default=0, editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        # Лента сообщества, профиль и «последний пост в группе»
+        # (ROW_NUMBER() по group_id) читают индекс по порядку,
+        # без сортировки
+        indexes = [
+            models.Index(fields=['group', '-pub_date', '-id']),
+            models.Index(fields=['author', '-pub_date', '-id']),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -44,6 +69,8 @@ class Comment(models.Model):
 
     class Meta():
         ordering = ['-created']
+        # Комментарии к посту листаются курсором по индексу, без сортировки
+        indexes = [models.Index(fields=['post', '-created', '-id'])]
 
 
 class Follow(models.Model):
@@ -51,3 +78,196 @@ class Follow(models.Model):
                              related_name='follower')
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name='following')
+    created = models.DateTimeField('Дата подписки', auto_now_add=True,
+                                   null=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
+        # Уникальный индекс (user, author) обслуживает подписки читателя,
+        # этот — подписчиков автора без обращения к таблице
+        indexes = [models.Index(fields=['author', 'user'])]
+
+
+class TimelineEntry(models.Model):
+    """Строка материализованной ленты подписок читателя.
+
+    Заполняется при публикации поста (fan-out on write), чтобы
+    ``follow_index`` читал только собственные строки пользователя.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='+')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date']
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post']),
+            models.Index(fields=['user', 'author']),
+        ]
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя для профиля.
+
+    Поддерживаются сигналами на создание и удаление ``Post`` и ``Follow``,
+    расхождения исправляет команда ``reconcile_counters``.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name='stats')
+    posts = models.PositiveIntegerField('Записей', default=0)
+    followers = models.PositiveIntegerField('Подписчиков', default=0,
+                                            db_index=True)
+    following = models.PositiveIntegerField('Подписок', default=0)
+    # Посты автора подмешиваются в ленты при чтении, см. posts.timeline
+    pulled = models.BooleanField('Режим чтения', default=False)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.posts}/{self.followers}/' \
+               f'{self.following}'
+
+
+class ImageVariant(models.Model):
+    """Уменьшенная копия картинки поста в современном формате."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='image_variants')
+    format = models.CharField(max_length=10)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    image = models.ImageField(upload_to='posts/variants/')
+
+    class Meta:
+        ordering = ['format', 'width']
+        unique_together = ('post', 'format', 'width')
+
+    def __str__(self):
+        return f'{self.image.name} ({self.width}w)'
+
+
+class FollowSuggestion(models.Model):
+    """Предложение подписаться, посчитанное командой ``build_suggestions``.
+
+    Для каждого читателя хранится не больше ``SUGGESTIONS_TOP_K`` строк,
+    упорядоченных по ``rank``, чтобы боковая панель читала их одним
+    запросом по индексу.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='suggestions')
+    suggested = models.ForeignKey(User, on_delete=models.CASCADE,
+                                  related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ['rank']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'suggested'],
+                                    name='unique_suggestion'),
+        ]
+        indexes = [models.Index(fields=['user', 'rank'])]
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.suggested_id}'
+
+
+class TrendingPost(models.Model):
+    """Оценка поста в «популярном», которую ведёт ``update_trending``.
+
+    Оценка — сумма весов событий (публикация, комментарии, новые
+    подписчики автора), затухающих экспоненциально со временем.
+    В таблице только посты с заметной оценкой.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE,
+                                primary_key=True, related_name='trending')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, blank=True,
+                              null=True, related_name='+')
+    score = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score']),
+            models.Index(fields=['group', '-score']),
+        ]
+
+
+class TrendingGroup(models.Model):
+    group = models.OneToOneField(Group, on_delete=models.CASCADE,
+                                 primary_key=True, related_name='trending')
+    score = models.FloatField(default=0, db_index=True)
+
+
+class TrendingRun(models.Model):
+    """Момент, до которого события уже учтены в оценках."""
+    finished_at = models.DateTimeField()
+
+
+class GroupDailyStats(models.Model):
+    """Дневная сводка активности сообщества.
+
+    Посты и комментарии считаются по дню публикации, авторы — разные
+    пользователи, писавшие в сообществе в этот день. Поддерживается
+    сигналами, см. ``posts.rollups``.
+    """
+    group = models.ForeignKey(Group, on_delete=models.CASCADE,
+                              related_name='daily_stats')
+    day = models.DateField('День')
+    posts = models.PositiveIntegerField('Записей', default=0)
+    comments = models.PositiveIntegerField('Комментариев', default=0)
+    authors = models.PositiveIntegerField('Авторов', default=0)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'day'],
+                                    name='unique_group_day'),
+        ]
+
+    def __str__(self):
+        return f'{self.group_id} {self.day}: {self.posts}/{self.comments}/' \
+               f'{self.authors}'
+
+
+class GroupDailyAuthor(models.Model):
+    """Автор, писавший в сообществе в этот день.
+
+    Нужен, чтобы число разных авторов в ``GroupDailyStats`` менялось
+    инкрементально, без ``COUNT(DISTINCT ...)`` по постам.
+    """
+    group = models.ForeignKey(Group, on_delete=models.CASCADE,
+                              related_name='+')
+    day = models.DateField()
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'day', 'author'],
+                                    name='unique_group_day_author'),
+        ]
+
+
+class ImportedPost(models.Model):
+    """Пост, загруженный командой ``import_yatube``, и его ``id`` в файле.
+
+    Посты получают свои ключи на сайте; по этой таблице комментарии из
+    файла находят свой пост, а повторная загрузка — уже загруженные.
+    """
+    source_id = models.BigIntegerField('id в источнике', primary_key=True)
+    post = models.OneToOneField(Post, on_delete=models.CASCADE,
+                                related_name='+')
+
+
+class AutocompleteSequence(models.Model):
+    """Счётчик номеров журнала автодополнения, см. ``posts.autocomplete``.
+
+    Одна строка; номер увеличивается ``UPDATE ... SET value = value + 1``
+    и поэтому не повторяется у воркеров, публикующих одновременно.
+    """
+    value = models.BigIntegerField(default=0)
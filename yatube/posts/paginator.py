@@ -0,0 +1,316 @@
+import base64
+import binascii
+import datetime
+import heapq
+import json
+import math
+import time
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+from . import metrics
+
+
+def encode_cursor(values):
+    """Упаковывает значения ключей сортировки в непрозрачный токен."""
+    prepared = [
+        value.isoformat() if isinstance(value, datetime.datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(prepared, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    padding = '=' * (-len(token) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(token + padding)
+        values = json.loads(raw.decode())
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(values, list) or not all(map(_valid_value, values)):
+        return None
+    return values
+
+
+def _valid_value(value):
+    """Значение ключа, которое можно передать в запрос.
+
+    Курсор приходит от клиента: списки, словари и числа вне 64 бит
+    ломают запрос уже при выполнении, а не при построении.
+    """
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return -2 ** 63 <= value < 2 ** 63
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return isinstance(value, str)
+
+
+class _LazyRows(Sequence):
+    """Строки страницы, которые выбираются при первом обращении."""
+
+    def __init__(self, load):
+        self._load = load
+        self._rows = None
+
+    @property
+    def rows(self):
+        if self._rows is None:
+            self._rows = self._load()
+        return self._rows
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по ключу (pub_date, id) вместо OFFSET.
+
+    Стоимость страницы не зависит от её глубины: выборка начинается
+    с индекса сразу после курсора, ``COUNT(*)`` не выполняется.
+    Возвращает обычный ``Page``; номер страницы условный (1 для первой,
+    2 для остальных), а ссылки строятся по ``next_cursor`` и
+    ``previous_cursor`` пагинатора.
+
+    Строки первой страницы и страниц «вперёд» выбираются лениво, при
+    первом обращении из шаблона: если фрагмент взят из кэша, запроса
+    к базе не будет.
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-id'), prepare=None, **kwargs):
+        self.ordering = tuple(ordering)
+        self.prepare = prepare
+        self._window = None
+        self._backwards = False
+        self._from_cursor = False
+        self._loaded = None
+        self._shown = None
+        super().__init__(object_list.order_by(*self.ordering), per_page,
+                         **kwargs)
+
+    def _load(self):
+        if self._loaded is None:
+            self._loaded = self._evaluate(self._window, self._backwards)
+            rows = self._loaded[0]
+            self._shown = (rows if self.prepare is None
+                           else self.prepare(rows))
+        return self._loaded
+
+    @property
+    def rows(self):
+        return self._load()[0]
+
+    @property
+    def shown(self):
+        """Строки страницы после ``prepare``; курсоры строятся по ``rows``."""
+        self._load()
+        return self._shown
+
+    @property
+    def more_after(self):
+        return self._backwards or self._load()[1]
+
+    @property
+    def more_before(self):
+        if self._backwards:
+            return self._load()[1]
+        return self._from_cursor
+
+    @property
+    def count(self):
+        number = 2 if self.more_before else 1
+        return (number - 1) * self.per_page + len(self.rows)
+
+    @property
+    def num_pages(self):
+        number = 2 if self.more_before else 1
+        return number + 1 if self.more_after else number
+
+    @property
+    def next_cursor(self):
+        if self.rows and self.more_after:
+            return self.cursor_for(self.rows[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.rows and self.more_before:
+            return self.cursor_for(self.rows[0])
+        return None
+
+    @property
+    def fields(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    @staticmethod
+    def value_of(obj, name):
+        """Поле строки: модели или словаря из ``values()``."""
+        if isinstance(obj, dict):
+            return obj[name]
+        return getattr(obj, name)
+
+    def cursor_for(self, obj):
+        return encode_cursor([self.value_of(obj, name)
+                              for name in self.fields])
+
+    def _seek(self, values, backwards):
+        """Условие «строго после курсора» в порядке сортировки."""
+        condition = Q()
+        for position, name in enumerate(self.ordering):
+            descending = name.startswith('-')
+            lookup = 'lt' if descending != backwards else 'gt'
+            step = Q(**{f'{self.fields[position]}__{lookup}':
+                        values[position]})
+            for prev_name, prev_value in zip(self.fields[:position],
+                                             values[:position]):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        return condition
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}'
+                for name in self.ordering]
+
+    def _seek_queryset(self, queryset, values, backwards):
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, backwards))
+        if backwards:
+            queryset = queryset.order_by(*self._reversed_ordering())
+        return queryset[:self.per_page + 1]
+
+    def _window_for(self, values, backwards):
+        return self._seek_queryset(self.object_list, values, backwards)
+
+    def _evaluate(self, window, backwards):
+        rows = list(window)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+        return rows, has_more
+
+    def _decode(self, token):
+        if not token:
+            return None
+        values = decode_cursor(token)
+        if values is None or len(values) != len(self.ordering):
+            return None
+        return values
+
+    def get_cursor_page(self, after=None, before=None):
+        """Возвращает страницу после ``after`` или перед ``before``.
+
+        Некорректный курсор, как и некорректный номер в ``get_page``,
+        приводит к первой странице. Страница «назад» выбирается сразу:
+        без неё не узнать, первая ли это страница.
+        """
+        window = None
+        for token, backwards in ((before, True), (after, False)):
+            values = self._decode(token)
+            if values is None:
+                continue
+            try:
+                window = self._window_for(values, backwards)
+            except (ValidationError, ValueError, TypeError):
+                break
+            self._backwards = backwards
+            self._from_cursor = True
+            break
+        if window is None:
+            window = self._window_for(None, False)
+        self._window = window
+        self._loaded = None
+        number = 2 if self.more_before else 1
+        return self._get_page(_LazyRows(lambda: self.shown), number, self)
+
+
+class MergedKeysetPaginator(KeysetPaginator):
+    """Курсорный пагинатор поверх нескольких упорядоченных источников.
+
+    Из каждого источника берётся не больше ``per_page + 1`` строк после
+    курсора, затем строки сливаются (k-way merge) по ключу сортировки.
+    Ключи сортировки должны иметь одно направление.
+    """
+
+    def __init__(self, sources, per_page,
+                 ordering=('-pub_date', '-id'), **kwargs):
+        self.sources = [source.order_by(*ordering) for source in sources]
+        super().__init__(self.sources[0], per_page, ordering=ordering,
+                         **kwargs)
+
+    def _key(self, obj):
+        return tuple(self.value_of(obj, name) for name in self.fields)
+
+    def _window_for(self, values, backwards):
+        return [self._seek_queryset(source, values, backwards)
+                for source in self.sources]
+
+    def _evaluate(self, window, backwards):
+        started = time.monotonic()
+        descending = self.ordering[0].startswith('-') != backwards
+        fetched = [list(rows) for rows in window]
+        merged = []
+        seen = set()
+        for obj in heapq.merge(*fetched, key=self._key, reverse=descending):
+            # Ключ сортировки уникален, по нему и убираются повторы
+            key = self._key(obj)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(obj)
+            if len(merged) > self.per_page:
+                break
+        has_more = len(merged) > self.per_page
+        merged = merged[:self.per_page]
+        if backwards:
+            merged.reverse()
+        metrics.incr('feed.merge.requests')
+        metrics.incr('feed.merge.sources', len(self.sources))
+        metrics.incr('feed.merge.rows_fetched',
+                     sum(len(rows) for rows in fetched))
+        metrics.incr('feed.merge.seconds', time.monotonic() - started)
+        return merged, has_more
+
+
+def paginate(request, object_list, per_page=None,
+             ordering=('-pub_date', '-id'), sources=None, prepare=None):
+    """Страница ленты по параметрам запроса.
+
+    ``?page=N`` даёт нумерованную страницу как раньше, иначе
+    используется курсор из ``?after=``/``?before=``. Если переданы
+    ``sources``, курсорная страница сливается из них, а ``object_list``
+    нужен только для нумерованных страниц. ``prepare`` вызывается
+    со списком строк страницы, когда они выбраны; страница показывает
+    то, что он вернёт.
+    """
+    per_page = per_page or settings.PAGES
+    page_number = request.GET.get('page')
+    if page_number is not None:
+        paginator = Paginator(object_list.order_by(*ordering), per_page)
+        page = paginator.get_page(page_number)
+        if prepare is not None:
+            rows = page.object_list
+            page.object_list = _LazyRows(lambda: prepare(list(rows)))
+        return page
+    if sources and len(sources) > 1:
+        paginator = MergedKeysetPaginator(sources, per_page,
+                                          ordering=ordering,
+                                          prepare=prepare)
+    else:
+        paginator = KeysetPaginator(object_list, per_page,
+                                    ordering=ordering, prepare=prepare)
+    return paginator.get_cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
@@ -0,0 +1,214 @@
+"""Дневные сводки активности сообществ.
+
+Для каждой пары (сообщество, день) ``GroupDailyStats`` хранит число
+постов, комментариев и разных авторов. Сигналы сдвигают счётчики
+через ``F()``; разные авторы учитываются строками ``GroupDailyAuthor``:
+автор добавляется первой записью за день и убирается, когда удалена
+последняя. Если строки сводки ещё нет или пост сменил сообщество,
+день пересчитывается по исходным таблицам (``recount_day``), а
+``rebuild`` строит все сводки заново.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (Count, F, IntegerField, OuterRef, Subquery,
+                              Sum)
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Comment, GroupDailyAuthor, GroupDailyStats, Post
+
+LATEST_POSTS_SQL = '''
+SELECT * FROM (
+    SELECT post.*, ROW_NUMBER() OVER (
+        PARTITION BY post.group_id
+        ORDER BY post.pub_date DESC, post.id DESC
+    ) AS position
+    FROM {table} AS post
+    WHERE post.group_id IN ({ids})
+)
+WHERE position = 1
+'''
+
+
+def day_of(moment):
+    return timezone.localdate(moment)
+
+
+def activity(group_id, day):
+    """Посты и комментарии сообщества за день."""
+    return (
+        Post.objects.filter(group_id=group_id, pub_date__date=day),
+        Comment.objects.filter(post__group_id=group_id, created__date=day),
+    )
+
+
+def recount_day(group_id, day):
+    """Пересчитывает сводку дня по исходным таблицам."""
+    posts, comments = activity(group_id, day)
+    authors = (set(posts.values_list('author_id', flat=True))
+               | set(comments.values_list('author_id', flat=True)))
+    day_authors = GroupDailyAuthor.objects.filter(group_id=group_id, day=day)
+    with transaction.atomic():
+        day_authors.exclude(author_id__in=authors).delete()
+        GroupDailyAuthor.objects.bulk_create(
+            [GroupDailyAuthor(group_id=group_id, day=day, author_id=author_id)
+             for author_id in authors],
+            ignore_conflicts=True,
+        )
+        if not authors:
+            GroupDailyStats.objects.filter(group_id=group_id,
+                                           day=day).delete()
+            return
+        GroupDailyStats.objects.update_or_create(
+            group_id=group_id, day=day,
+            defaults={'posts': posts.count(), 'comments': comments.count(),
+                      'authors': len(authors)},
+        )
+
+
+def _shift(group_id, day, field, delta):
+    rows = GroupDailyStats.objects.filter(group_id=group_id, day=day)
+    if delta < 0:
+        rows = rows.filter(**{f'{field}__gte': -delta})
+    return rows.update(**{field: F(field) + delta})
+
+
+def record(group_id, moment, author_id, field):
+    """Учитывает новый пост (``field='posts'``) или комментарий."""
+    if group_id is None:
+        return
+    day = day_of(moment)
+    with transaction.atomic():
+        if not _shift(group_id, day, field, 1):
+            recount_day(group_id, day)
+            return
+        _, created = GroupDailyAuthor.objects.get_or_create(
+            group_id=group_id, day=day, author_id=author_id
+        )
+        if created:
+            _shift(group_id, day, 'authors', 1)
+
+
+def forget(group_id, moment, author_id, field):
+    """Убирает из сводки удалённый пост или комментарий."""
+    if group_id is None:
+        return
+    day = day_of(moment)
+    posts, comments = activity(group_id, day)
+    with transaction.atomic():
+        _shift(group_id, day, field, -1)
+        if (posts.filter(author_id=author_id).exists()
+                or comments.filter(author_id=author_id).exists()):
+            return
+        deleted, _ = GroupDailyAuthor.objects.filter(
+            group_id=group_id, day=day, author_id=author_id
+        ).delete()
+        if deleted:
+            _shift(group_id, day, 'authors', -1)
+
+
+def post_days(post):
+    """Дни, в которые пост и его комментарии попали в сводки."""
+    days = {day_of(post.pub_date)}
+    days.update(day_of(moment) for moment in Comment.objects.filter(
+        post=post).values_list('created', flat=True))
+    return days
+
+
+def move_post(post, previous_group_id):
+    """Пересчитывает дни обоих сообществ, когда пост сменил сообщество."""
+    groups = {previous_group_id, post.group_id} - {None}
+    if not groups:
+        return
+    recount({(group_id, day) for group_id in groups
+             for day in post_days(post)})
+
+
+def recount(pairs):
+    for group_id, day in sorted(pairs):
+        recount_day(group_id, day)
+
+
+def rebuild():
+    """Строит все сводки заново; возвращает число дней."""
+    sources = (
+        ('posts', Post.objects.annotate(day=TruncDate('pub_date')),
+         'group_id'),
+        ('comments', Comment.objects.annotate(day=TruncDate('created')),
+         'post__group_id'),
+    )
+    stats = {}
+    authors = set()
+    for field, rows, group in sources:
+        rows = rows.filter(**{f'{group}__isnull': False}).order_by()
+        for group_id, day, total in rows.values_list(group, 'day').annotate(
+                total=Count('id')):
+            row = stats.setdefault((group_id, day), GroupDailyStats(
+                group_id=group_id, day=day))
+            setattr(row, field, total)
+        authors.update(
+            rows.values_list(group, 'day', 'author_id').distinct().iterator()
+        )
+    for group_id, day, _ in authors:
+        stats[group_id, day].authors += 1
+    with transaction.atomic():
+        GroupDailyAuthor.objects.all().delete()
+        GroupDailyStats.objects.all().delete()
+        GroupDailyAuthor.objects.bulk_create(
+            [GroupDailyAuthor(group_id=group_id, day=day, author_id=author_id)
+             for group_id, day, author_id in authors],
+            batch_size=1000,
+        )
+        GroupDailyStats.objects.bulk_create(stats.values(), batch_size=1000)
+    return len(stats)
+
+
+def _total(field):
+    return Coalesce(Subquery(
+        GroupDailyStats.objects.filter(group=OuterRef('pk'))
+        .order_by().values('group').annotate(total=Sum(field))
+        .values('total'), output_field=IntegerField()
+    ), 0)
+
+
+def with_totals(groups):
+    """Добавляет к сообществам суммы сводок.
+
+    ``total_posts`` и ``total_comments`` — за всё время,
+    ``active_authors`` — разные авторы за ``GROUP_ACTIVE_DAYS`` дней.
+    """
+    since = timezone.localdate() - datetime.timedelta(
+        days=settings.GROUP_ACTIVE_DAYS - 1
+    )
+    active = Coalesce(Subquery(
+        GroupDailyAuthor.objects.filter(group=OuterRef('pk'), day__gte=since)
+        .order_by().values('group')
+        .annotate(total=Count('author', distinct=True)).values('total'),
+        output_field=IntegerField()
+    ), 0)
+    return groups.annotate(total_posts=_total('posts'),
+                           total_comments=_total('comments'),
+                           active_authors=active)
+
+
+def latest_posts(group_ids):
+    """Последний пост каждого сообщества одним запросом с ROW_NUMBER()."""
+    group_ids = list(group_ids)
+    if not group_ids:
+        return {}
+    sql = LATEST_POSTS_SQL.format(
+        table=Post._meta.db_table,
+        ids=', '.join(['%s'] * len(group_ids)),
+    )
+    return {post.group_id: post
+            for post in Post.objects.raw(sql, group_ids)}
+
+
+def attach_latest(groups):
+    """Кладёт в ``group.latest_post`` последний пост; для ``paginate``."""
+    latest = latest_posts(group.pk for group in groups)
+    for group in groups:
+        group.latest_post = latest.get(group.pk)
+    return groups
@@ -0,0 +1,119 @@
+"""Чтение страниц с реплик, запись — в основную базу.
+
+Реплики перечислены в ``DATABASE_REPLICAS``. Читать с них разрешено
+только внутри страниц, помеченных ``replica_reads``, и только для
+GET/HEAD: на весь запрос выбирается одна реплика, остальной код
+(формы, команды, фоновые задачи) читает основную базу.
+
+Реплика может отставать, поэтому после записи пользователь получает
+cookie ``REPLICA_STICKY_COOKIE`` на ``REPLICA_STICKY_SECONDS`` и на это
+время читает только основную базу — так он видит свои изменения.
+Cookie ставят только записи моделей из ``REPLICA_STICKY_MODELS``:
+служебные записи при чтении (сессия, миниатюры, счётчики) его не дают.
+
+ETag, Last-Modified и ключи кэша страниц строятся по версиям тегов,
+которые основная база уже сдвинула. Чтобы отставшая реплика не попала
+в кэш под новой версией, страница, строки которой меняли за
+последние ``REPLICA_STICKY_SECONDS``, тоже читает основную базу.
+Комментарии в этом не участвуют: иначе при любой активности главная
+лента никогда не читала бы реплику, а отставший счётчик комментариев
+безвреден.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+
+PRIMARY = 'default'
+
+_state = threading.local()
+
+
+def replicas():
+    return settings.DATABASE_REPLICAS
+
+
+@contextmanager
+def reading_from_replica():
+    """Направляет чтения потока в одну случайную реплику."""
+    previous = getattr(_state, 'replica', None)
+    aliases = replicas()
+    _state.replica = random.choice(aliases) if aliases else None
+    try:
+        yield _state.replica
+    finally:
+        _state.replica = previous
+
+
+def is_sticky(request):
+    return settings.REPLICA_STICKY_COOKIE in request.COOKIES
+
+
+def recently_written(request):
+    """Строки страницы меняли не раньше ``REPLICA_STICKY_SECONDS``."""
+    from . import cache_tags
+    tags = cache_tags.request_tags(request)
+    if tags is None:
+        return False
+    tags = [cache_tags.row_tag(tag) for tag in tags]
+    since = (time.time() - settings.REPLICA_STICKY_SECONDS) * 1000
+    return max(cache_tags.versions(*tags)) > since
+
+
+def replica_reads(view):
+    """Страница читает реплику, если ни пользователь, ни другие
+    недавно не писали в её область."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method not in ('GET', 'HEAD') or is_sticky(request)
+                or not replicas() or recently_written(request)):
+            return view(request, *args, **kwargs)
+        with reading_from_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'replica', None) or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        if model._meta.label_lower in settings.REPLICA_STICKY_MODELS:
+            _state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *replicas()}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replicas():
+            return False
+        return None
+
+
+class StickyPrimaryMiddleware:
+    """Ставит cookie чтения из основной базы после записи.
+
+    Стоит после ``SessionMiddleware``: сохранение сессии само по себе
+    не делает пользователя «писавшим».
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.wrote = False
+        response = self.get_response(request)
+        if _state.wrote and replicas():
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
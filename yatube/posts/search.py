@@ -0,0 +1,98 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Comment, Post
+
+WORD = re.compile(r'\w+')
+
+
+def index_for(model):
+    return f'{model._meta.db_table}_fts'
+
+
+def indexed_tables():
+    return [Post._meta.db_table, Comment._meta.db_table]
+
+
+def _trigger_sql(table):
+    index = f'{table}_fts'
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {index}_ai AFTER INSERT ON {table} "
+        f"BEGIN INSERT INTO {index}(rowid, text) "
+        f"VALUES (new.id, new.text); END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_ad AFTER DELETE ON {table} "
+        f"BEGIN INSERT INTO {index}({index}, rowid, text) "
+        f"VALUES ('delete', old.id, old.text); END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_au "
+        f"AFTER UPDATE OF text ON {table} BEGIN "
+        f"INSERT INTO {index}({index}, rowid, text) "
+        f"VALUES ('delete', old.id, old.text); "
+        f"INSERT INTO {index}(rowid, text) VALUES (new.id, new.text); END",
+    ]
+
+
+def suspend_sync():
+    """Снимает триггеры синхронизации индексов на время массовой записи."""
+    with connection.cursor() as cursor:
+        for table in indexed_tables():
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{suffix}')
+
+
+def resume_sync():
+    """Возвращает триггеры и перестраивает индексы по таблицам."""
+    with connection.cursor() as cursor:
+        for table in indexed_tables():
+            for statement in _trigger_sql(table):
+                cursor.execute(statement)
+            index = f'{table}_fts'
+            cursor.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+
+
+def match_expression(query):
+    """Запрос пользователя в виде безопасного выражения FTS5 MATCH.
+
+    Каждое слово берётся в кавычки, поэтому операторы FTS5 в запросе
+    не работают и не ломают разбор; последнее слово ищется по префиксу.
+    """
+    words = WORD.findall(query or '')
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def filter_queryset(queryset, query):
+    """Оставляет в ``queryset`` строки, найденные по FTS-индексу модели."""
+    expression = match_expression(query)
+    if expression is None:
+        return queryset.none()
+    index = index_for(queryset.model)
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {index} WHERE {index} MATCH %s', (expression,)
+    ))
+
+
+def search_posts(query):
+    """Посты по запросу с релевантностью ``rank`` (bm25, меньше — лучше).
+
+    Индекс присоединяется к таблице постов, так что сортировка
+    по ``('rank', 'id')`` и курсор по ним обходятся без подзапросов.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        # Пустой запрос: ``rank`` нужен для той же сортировки и курсора
+        return Post.objects.none().annotate(
+            rank=Value(0.0, output_field=FloatField())
+        )
+    index = index_for(Post)
+    table = connection.ops.quote_name(Post._meta.db_table)
+    return Post.objects.extra(
+        tables=[index],
+        where=[f'{index}.rowid = {table}.id', f'{index} MATCH %s'],
+        params=[expression],
+    ).annotate(rank=RawSQL(f'{index}.rank', ()))
@@ -0,0 +1,227 @@
+import threading
+
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import (autocomplete, cache_tags, counters, rollups, timeline,
+               trending)
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def bump_post_pages(post, *group_ids):
+    """Инвалидирует ленты и страницы, на которых виден пост."""
+    slugs = Group.objects.filter(
+        pk__in=[pk for pk in group_ids if pk]
+    ).values_list('slug', flat=True)
+    cache_tags.bump(
+        'feed',
+        f'post:{post.pk}',
+        f'author:{post.author.username}',
+        *[f'group:{slug}' for slug in slugs],
+    )
+
+
+@receiver(post_save, sender=User)
+def create_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+def user_index_entries(username, is_active):
+    return autocomplete.user_entries(username) if is_active else []
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, update_fields=None, **kwargs):
+    instance._index_entries = []
+    if instance.pk and update_fields != frozenset({'last_login'}):
+        previous = (User.objects.filter(pk=instance.pk)
+                    .values_list('username', 'is_active').first())
+        if previous is not None:
+            instance._index_entries = user_index_entries(*previous)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields == frozenset({'last_login'}):
+        return
+    autocomplete.publish(
+        removed=getattr(instance, '_index_entries', []),
+        added=user_index_entries(instance.username, instance.is_active),
+    )
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    autocomplete.publish(
+        removed=user_index_entries(instance.username, instance.is_active)
+    )
+
+
+_deleting = threading.local()
+
+
+def deleting_posts():
+    """Удаляемые посты потока -> дни сводок, которые надо пересчитать."""
+    if not hasattr(_deleting, 'posts'):
+        _deleting.posts = {}
+    return _deleting.posts
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    instance._previous_group_id = None
+    if instance.pk:
+        instance._previous_group_id = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if created:
+        counters.bump_user(instance.author_id, 'posts', 1)
+        timeline.fan_out(instance)
+        rollups.record(instance.group_id, instance.pub_date,
+                       instance.author_id, 'posts')
+    elif previous_group_id != instance.group_id:
+        rollups.move_post(instance, previous_group_id)
+        trending.move_post(instance)
+    bump_post_pages(instance, instance.group_id, previous_group_id)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # Комментарии удаляются каскадом раньше поста: вместо forget() на
+    # каждый сводки пересчитываются один раз по дням поста
+    days = rollups.post_days(instance) if instance.group_id else ()
+    deleting_posts()[instance.pk] = {(instance.group_id, day)
+                                     for day in days}
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'posts', -1)
+    pairs = deleting_posts().pop(instance.pk, None)
+    if pairs is None:
+        rollups.forget(instance.group_id, instance.pub_date,
+                       instance.author_id, 'posts')
+    else:
+        rollups.recount(pairs)
+    bump_post_pages(instance, instance.group_id)
+
+
+def comment_post(comment):
+    """Сообщество поста комментария и теги его страниц одним запросом."""
+    found = (
+        Post.objects.filter(pk=comment.post_id)
+        .values_list('group_id', 'author__username', 'group__slug').first()
+    )
+    tags = ['feed', f'post:{comment.post_id}']
+    if found is None:
+        return None, tags
+    group_id, author, slug = found
+    tags.append(f'author:{author}')
+    if slug is not None:
+        tags.append(f'group:{slug}')
+    return group_id, tags
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_comments(instance.post_id, 1)
+        group_id, tags = comment_post(instance)
+        rollups.record(group_id, instance.created, instance.author_id,
+                       'comments')
+        cache_tags.bump(*tags, rows=False)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.post_id in deleting_posts():
+        # Пост удаляется целиком: счётчик, сводки и страницы обновит он
+        return
+    counters.bump_comments(instance.post_id, -1)
+    group_id, tags = comment_post(instance)
+    rollups.forget(group_id, instance.created, instance.author_id,
+                   'comments')
+    cache_tags.bump(*tags, rows=False)
+
+
+def group_post_tags(group):
+    """Теги страниц, где рядом с постами сообщества видно его название."""
+    posts = Post.objects.filter(group=group).order_by()
+    authors = posts.values_list('author__username', flat=True).distinct()
+    return [*(f'author:{username}' for username in authors),
+            *(f'post:{pk}' for pk in posts.values_list('pk', flat=True))]
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    # После удаления у постов уже не будет сообщества
+    instance._post_tags = group_post_tags(instance)
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_title(sender, instance, **kwargs):
+    instance._index_entries = []
+    if instance.pk:
+        previous = (Group.objects.filter(pk=instance.pk)
+                    .values_list('slug', 'title').first())
+        if previous is not None:
+            instance._index_entries = autocomplete.group_entries(*previous)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    post_tags = getattr(instance, '_post_tags', None)
+    if post_tags is None and not kwargs.get('created'):
+        post_tags = group_post_tags(instance)
+    cache_tags.bump('feed', f'group:{instance.slug}', *(post_tags or []))
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    autocomplete.publish(
+        removed=getattr(instance, '_index_entries', []),
+        added=autocomplete.group_entries(instance.slug, instance.title),
+    )
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    autocomplete.publish(
+        removed=autocomplete.group_entries(instance.slug, instance.title)
+    )
+
+
+def bump_follow_pages(follow):
+    cache_tags.bump(
+        f'follow:{follow.user_id}',
+        f'author:{follow.author.username}',
+        f'author:{follow.user.username}',
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, 'followers', 1)
+        counters.bump_user(instance.user_id, 'following', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        timeline.followers_changed(instance.author_id, 1)
+        bump_follow_pages(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'followers', -1)
+    counters.bump_user(instance.user_id, 'following', -1)
+    timeline.trim(instance.user_id, instance.author_id)
+    timeline.followers_changed(instance.author_id, -1)
+    bump_follow_pages(instance)
@@ -0,0 +1,63 @@
+"""Настройка соединений SQLite и повтор записей при блокировке.
+
+Прагмы из ``SQLITE_PRAGMAS`` выполняются на каждом новом соединении.
+В профиле ``production`` это WAL (читатели не ждут писателя),
+``synchronous=NORMAL``, увеличенный кэш страниц, ``mmap`` и временные
+таблицы в памяти; вместе с ``CONN_MAX_AGE`` соединение и его кэш
+живут между запросами.
+
+В WAL писатель всё равно один. ``timeout`` соединения ждёт, пока
+занятая блокировка освободится, но транзакция, начатая чтением,
+получает ``database is locked`` сразу, если за это время писал кто-то
+ещё. Такую транзакцию ``atomic_with_retry`` повторяет целиком.
+"""
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import metrics
+from .routers import PRIMARY
+
+
+def apply_pragmas(connection, pragmas):
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite' and settings.SQLITE_PRAGMAS:
+        apply_pragmas(connection, settings.SQLITE_PRAGMAS)
+
+
+def is_locked(error):
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def atomic_with_retry(func, *args, using=PRIMARY, **kwargs):
+    """Вызывает ``func`` в транзакции и повторяет её при блокировке базы.
+
+    Повторов не больше ``SQLITE_WRITE_RETRIES``, пауза растёт вдвое
+    от ``SQLITE_RETRY_DELAY`` со случайным разбросом. Внутри чужой
+    транзакции повторять нечего: ошибка уходит наружу.
+    """
+    attempt = 0
+    while True:
+        try:
+            with transaction.atomic(using=using):
+                return func(*args, **kwargs)
+        except OperationalError as error:
+            if (not is_locked(error)
+                    or attempt >= settings.SQLITE_WRITE_RETRIES
+                    or transaction.get_connection(using).in_atomic_block):
+                raise
+        attempt += 1
+        metrics.incr('db.write_retries')
+        time.sleep(settings.SQLITE_RETRY_DELAY * 2 ** (attempt - 1)
+                   * random.uniform(0.5, 1.5))
@@ -0,0 +1,126 @@
+"""Предложения «на кого подписаться», посчитанные по графу подписок.
+
+Граф подписок загружается целиком в разреженную матрицу ``A``
+(строка — читатель, столбец — автор). Для пачки читателей ``B``
+оценка складывается из двух частей:
+
+* друзья друзей — ``B @ A``: авторы, на которых подписаны те, на кого
+  подписан читатель;
+* со-подписки — ``(B @ A'.T) @ A``: авторы, на которых подписаны
+  читатели с общими подписками. ``A'`` — граф без популярных авторов
+  (больше ``SUGGESTIONS_MAX_AUTHOR_FOLLOWERS`` подписчиков): общая
+  подписка на них ничего не говорит о вкусах и раздувает матрицу.
+
+Уже отслеживаемые авторы и сам читатель отбрасываются, для каждого
+читателя сохраняются лучшие ``top_k`` строк ``FollowSuggestion``.
+"""
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from . import cache_tags
+from .models import Follow, FollowSuggestion
+
+
+def load_graph(chunk_size):
+    """Идентификаторы пользователей и матрица подписок по их индексам."""
+    edges = Follow.objects.values_list('user_id', 'author_id').iterator(
+        chunk_size=chunk_size
+    )
+    flat = np.fromiter(chain.from_iterable(edges), dtype=np.int64)
+    ids, inverse = np.unique(flat, return_inverse=True)
+    pairs = inverse.reshape(-1, 2)
+    size = len(ids)
+    graph = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float32), (pairs[:, 0], pairs[:, 1])),
+        shape=(size, size),
+    )
+    return ids, graph
+
+
+def without_popular(graph, max_followers):
+    followers = np.asarray(graph.sum(axis=0)).ravel()
+    keep = (followers <= max_followers).astype(np.float32)
+    return (graph @ sparse.diags(keep)).tocsr()
+
+
+def score_batch(graph, limited_t, start, stop, weight):
+    """Оценки кандидатов для читателей ``start:stop``."""
+    batch = graph[start:stop]
+    scores = batch @ graph
+    if weight:
+        scores = scores + weight * ((batch @ limited_t) @ graph)
+    rows = np.arange(stop - start)
+    own = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, rows + start)),
+        shape=scores.shape,
+    )
+    excluded = ((batch + own) > 0).astype(np.float32)
+    scores = (scores - scores.multiply(excluded)).tocsr()
+    scores.eliminate_zeros()
+    return scores
+
+
+def top_rows(scores, ids, start, top_k):
+    """Лучшие ``top_k`` кандидатов каждой строки: по оценке, затем по id."""
+    for row in range(scores.shape[0]):
+        low, high = scores.indptr[row], scores.indptr[row + 1]
+        if low == high:
+            continue
+        values = scores.data[low:high]
+        columns = scores.indices[low:high]
+        if len(values) > top_k:
+            # Порог — k-я оценка; равные ей берутся все, чтобы ничьи
+            # решались по id, а не порядком argpartition
+            threshold = -np.partition(-values, top_k - 1)[top_k - 1]
+            best = np.flatnonzero(values >= threshold)
+        else:
+            best = np.arange(len(values))
+        best = best[np.lexsort((ids[columns[best]], -values[best]))][:top_k]
+        user_id = int(ids[start + row])
+        for rank, position in enumerate(best):
+            yield FollowSuggestion(
+                user_id=user_id, suggested_id=int(ids[columns[position]]),
+                score=float(values[position]), rank=rank,
+            )
+
+
+def build(batch_size=None, top_k=None, weight=None, max_followers=None):
+    """Пересчитывает предложения всех читателей; возвращает число строк."""
+    batch_size = batch_size or settings.SUGGESTIONS_BATCH_SIZE
+    top_k = top_k or settings.SUGGESTIONS_TOP_K
+    if weight is None:
+        weight = settings.SUGGESTIONS_CO_FOLLOW_WEIGHT
+    max_followers = (max_followers
+                     or settings.SUGGESTIONS_MAX_AUTHOR_FOLLOWERS)
+    ids, graph = load_graph(batch_size)
+    limited_t = without_popular(graph, max_followers).T.tocsr()
+    written = 0
+    for start in range(0, len(ids), batch_size):
+        stop = min(start + batch_size, len(ids))
+        scores = score_batch(graph, limited_t, start, stop, weight)
+        rows = list(top_rows(scores, ids, start, top_k))
+        users = [int(user_id) for user_id in ids[start:stop]]
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=users).delete()
+            FollowSuggestion.objects.bulk_create(rows, batch_size=batch_size)
+        cache_tags.bump(*[f'follow:{user_id}' for user_id in users])
+        written += len(rows)
+    FollowSuggestion.objects.exclude(
+        user_id__in=Follow.objects.values('user_id')
+    ).delete()
+    return written
+
+
+def for_user(user, limit=None):
+    """Предложения для боковой панели одним запросом по (user, rank)."""
+    return (
+        FollowSuggestion.objects.filter(user=user)
+        .exclude(suggested_id__in=Follow.objects.filter(
+            user=user).values('author_id'))
+        .select_related('suggested')
+        .order_by('rank')[:limit or settings.SUGGESTIONS_SHOWN]
+    )
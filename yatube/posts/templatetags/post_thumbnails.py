@@ -0,0 +1,21 @@
+from django import template
+
+from posts import variants
+from posts.thumbnails import ready_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post, preset='card'):
+    """Готовая миниатюра поста: из пачки ``attach_thumbnails``,
+    а если её не было — отдельным запросом к хранилищу."""
+    prepared = getattr(post, '_thumbnails', None)
+    if prepared is not None:
+        return prepared.get(preset)
+    return ready_thumbnail(post.image, preset)
+
+
+@register.filter
+def image_sources(post):
+    return variants.sources(post)
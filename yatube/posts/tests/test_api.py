@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import cache_tags
+from ..models import Comment, Follow, Group, Post, User
+
+
+@override_settings(PAGES=2)
+class TestApi(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.posts = [
+            Post.objects.create(text=f'Пост {i}', author=cls.author,
+                                group=cls.group)
+            for i in range(3)
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_feeds_are_cursor_paginated(self):
+        """Ленты отдаются страницами по курсору со ссылкой на следующую"""
+        self.client.force_login(TestApi.reader)
+        for name, kwargs in (
+            ('api:index', {}),
+            ('api:group', {'slug': 'group'}),
+            ('api:profile', {'username': 'Author'}),
+            ('api:follow_index', {}),
+        ):
+            with self.subTest(name=name):
+                data = self.client.get(reverse(name, kwargs=kwargs)).json()
+                self.assertEqual([row['text'] for row in data['results']],
+                                 ['Пост 2', 'Пост 1'])
+                data = self.client.get(data['next']).json()
+                self.assertEqual([row['text'] for row in data['results']],
+                                 ['Пост 0'])
+                self.assertIsNone(data['next'])
+
+    def test_post_and_comments(self):
+        """Пост и его комментарии отдаются в виде проекций"""
+        post = TestApi.posts[0]
+        Comment.objects.create(post=post, author=TestApi.reader,
+                               text='Отлично')
+        data = self.client.get(reverse('api:post', args=[post.pk])).json()
+        self.assertEqual(data['author'], 'Author')
+        self.assertEqual(data['group'], 'group')
+        self.assertEqual(data['comment_count'], 1)
+        data = self.client.get(reverse('api:comments',
+                                       args=[post.pk])).json()
+        self.assertEqual(data['results'][0]['author'], 'Reader')
+
+    def test_not_modified_until_feed_changes(self):
+        """Повторный запрос с ETag получает 304, пока лента не изменится"""
+        url = reverse('api:group', kwargs={'slug': 'group'})
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Comment.objects.create(post=TestApi.posts[2], author=TestApi.reader,
+                               text='Новый комментарий')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_follows_writes_of_other_workers(self):
+        """ETag меняется после записи, сделанной другим процессом"""
+        url = reverse('api:profile', kwargs={'username': 'Author'})
+        etag = self.client.get(url)['ETag']
+        key = cache_tags.VERSION_KEY.format('author:Author')
+        # Другой воркер пишет версию тега только в общий кэш
+        shared = caches[settings.CACHE_TAGS_ALIAS]
+        shared.set(key, shared.get(key) + 1)
+        cache.clear()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_errors_are_json(self):
+        """Ошибки API отдаются в JSON"""
+        response = self.client.get(reverse('api:follow_index'))
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get(reverse('api:post', args=[999]))
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('detail', response.json())
@@ -0,0 +1,105 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import autocomplete, cache_tags
+from ..models import Group, User
+
+
+class TestAutocomplete(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        User.objects.create_user(username='leo')
+        User.objects.create_user(username='Leonid')
+        User.objects.create_user(username='anna')
+        Group.objects.create(title='Львы и тигры', slug='lions',
+                             description='Про больших кошек')
+
+    def setUp(self):
+        cache.clear()
+        autocomplete.warm()
+        self.client = Client()
+
+    def values(self, query):
+        response = self.client.get(reverse('autocomplete'), {'q': query})
+        return [(item['type'], item['value'])
+                for item in response.json()['results']]
+
+    def test_prefix_is_case_insensitive(self):
+        """Префикс ищется без учёта регистра, результаты отсортированы"""
+        self.assertEqual(self.values('LE'),
+                         [('user', 'leo'), ('user', 'Leonid')])
+
+    def test_group_found_by_slug_and_title_words(self):
+        """Сообщество находится по slug и по словам названия"""
+        self.assertIn(('group', 'lions'), self.values('li'))
+        self.assertEqual(self.values('тиг'), [('group', 'lions')])
+
+    def test_answers_without_database(self):
+        """Прогретый индекс отвечает без запросов к базе"""
+        with CaptureQueriesContext(connection) as queries:
+            self.values('an')
+        self.assertEqual(len(queries), 0)
+
+    def test_signup_and_group_creation_update_index(self):
+        """Новые пользователи и сообщества попадают в индекс сразу"""
+        User.objects.create_user(username='leopold')
+        Group.objects.create(title='Лисы', slug='foxes', description='-')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIn(('user', 'leopold'), self.values('leop'))
+            self.assertEqual(self.values('fox'), [('group', 'foxes')])
+        self.assertEqual(len(queries), 0)
+
+    def test_renamed_group_updates_index(self):
+        """Переименование сообщества меняет индекс без пересборки"""
+        group = Group.objects.get(slug='lions')
+        group.title = 'Пантеры'
+        group.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.values('пант'), [('group', 'lions')])
+            self.assertEqual(self.values('тиг'), [])
+        self.assertEqual(len(queries), 0)
+
+    def test_changes_of_other_workers_are_applied(self):
+        """Изменения из журнала применяются к индексу без базы"""
+        autocomplete._append(
+            (autocomplete.user_entries('anna'),
+             autocomplete.user_entries('hanna'))
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.values('han'), [('user', 'hanna')])
+            self.assertEqual(self.values('ann'), [])
+        self.assertEqual(len(queries), 0)
+
+    def test_concurrent_changes_get_distinct_numbers(self):
+        """Номер изменения не повторяется, даже если голова в кэше отстала"""
+        store = cache_tags.store()
+        head = autocomplete._head()
+        first = autocomplete._append(
+            (autocomplete.user_entries('anna'), [])
+        )
+        store.set(autocomplete.HEAD_KEY, head, None)
+        second = autocomplete._append(
+            ([], autocomplete.user_entries('hanna'))
+        )
+        self.assertGreater(second, first)
+        self.assertEqual(self.values('an'), [])
+        self.assertEqual(self.values('han'), [('user', 'hanna')])
+
+    def test_unrelated_user_save_keeps_index(self):
+        """Сохранение пользователя без смены имени не трогает журнал"""
+        head = autocomplete._head()
+        user = User.objects.get(username='anna')
+        user.first_name = 'Анна'
+        user.save()
+        self.assertEqual(autocomplete._head(), head)
+
+    def test_invalidate_rebuilds_index(self):
+        """После invalidate индекс строится заново по базе"""
+        autocomplete.invalidate()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.values('an'), [('user', 'anna')])
+        self.assertGreater(len(queries), 0)
@@ -0,0 +1,64 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Post, User, UserStats
+
+
+class TestCounters(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_and_comment_counters(self):
+        """Создание и удаление постов и комментариев меняет счётчики"""
+        post = Post.objects.create(text='текст', author=TestCounters.author)
+        Comment.objects.create(post=post, author=TestCounters.reader,
+                               text='комментарий')
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(self.stats(TestCounters.author).posts, 1)
+        post.delete()
+        self.assertEqual(self.stats(TestCounters.author).posts, 0)
+
+    def test_follow_counters(self):
+        """Подписка и отписка через views меняют счётчики"""
+        client = Client()
+        client.force_login(TestCounters.reader)
+        url_kwargs = {'username': TestCounters.author}
+        client.get(reverse('profile_follow', kwargs=url_kwargs))
+        client.get(reverse('profile_follow', kwargs=url_kwargs))
+        self.assertEqual(self.stats(TestCounters.author).followers, 1)
+        self.assertEqual(self.stats(TestCounters.reader).following, 1)
+        response = client.get(reverse('profile', kwargs=url_kwargs))
+        self.assertEqual(response.context['followers'], 1)
+        client.get(reverse('profile_unfollow', kwargs=url_kwargs))
+        self.assertEqual(self.stats(TestCounters.author).followers, 0)
+
+    def test_cascade_delete(self):
+        """Удаление пользователя уменьшает счётчики его подписок"""
+        follower = User.objects.create_user(username='Follower')
+        Follow.objects.create(user=follower, author=TestCounters.author)
+        follower.delete()
+        self.assertEqual(self.stats(TestCounters.author).followers, 0)
+
+    def test_reconcile_command(self):
+        """Команда reconcile_counters исправляет расхождения"""
+        post = Post.objects.create(text='текст', author=TestCounters.author)
+        Comment.objects.create(post=post, author=TestCounters.reader,
+                               text='комментарий')
+        UserStats.objects.filter(user=TestCounters.author).update(posts=7)
+        UserStats.objects.filter(user=TestCounters.reader).delete()
+        Post.objects.filter(pk=post.pk).update(comment_count=0)
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.stats(TestCounters.author).posts, 1)
+        self.assertEqual(self.stats(TestCounters.reader).posts, 0)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
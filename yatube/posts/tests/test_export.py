@@ -0,0 +1,84 @@
+import csv
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, EXPORT_CHUNK_SIZE=2)
+class TestExport(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Writer')
+        cls.other = User.objects.create_user(username='Other')
+        cls.posts = [
+            Post.objects.create(text=f'Пост {i}', author=cls.user)
+            for i in range(3)
+        ]
+        cls.posts[0].image = SimpleUploadedFile(
+            'pixel.gif', b'GIF89a\x01\x00\x01\x00\x00\x00\x00;',
+            content_type='image/gif',
+        )
+        cls.posts[0].save()
+        Comment.objects.create(post=cls.posts[1], author=cls.user,
+                               text='Свой комментарий')
+        Post.objects.create(text='Чужой пост', author=cls.other)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(TestExport.user)
+
+    def download(self, fmt):
+        response = self.client.get(reverse('export'), {'format': fmt})
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_jsonl_contains_only_own_rows(self):
+        """В выгрузке только посты и комментарии пользователя"""
+        rows = [json.loads(line)
+                for line in self.download('jsonl').decode().splitlines()]
+        self.assertEqual([row['type'] for row in rows],
+                         ['post', 'post', 'post', 'comment'])
+        self.assertEqual({row['author'] for row in rows}, {'Writer'})
+
+    def test_csv(self):
+        """CSV выгружается с заголовком"""
+        reader = csv.DictReader(io.StringIO(self.download('csv').decode()))
+        self.assertEqual(len(list(reader)), 4)
+
+    def test_zip_bundles_images(self):
+        """ZIP содержит выгрузку и картинки постов"""
+        archive = zipfile.ZipFile(io.BytesIO(self.download('zip')))
+        self.assertIn('export.jsonl', archive.namelist())
+        self.assertIn(TestExport.posts[0].image.name, archive.namelist())
+
+    def test_command_output_can_be_imported(self):
+        """Выгрузку команды можно загрузить обратно import_yatube"""
+        out = StringIO()
+        call_command('export_yatube', 'Writer', stdout=out)
+        Post.objects.filter(author=TestExport.user).delete()
+        _, path = tempfile.mkstemp(suffix='.jsonl', dir=TEMP_MEDIA_ROOT)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(out.getvalue())
+        call_command('import_yatube', path, stdout=StringIO())
+        self.assertEqual(Post.objects.filter(author=TestExport.user).count(),
+                         3)
+        self.assertEqual(Comment.objects.filter(author=TestExport.user)
+                         .count(), 1)
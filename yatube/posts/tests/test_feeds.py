@@ -0,0 +1,65 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Group, Post, User
+
+
+class TestFeeds(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        Post.objects.create(text='В группе', author=cls.author,
+                            group=cls.group)
+        Post.objects.create(text='Вне группы', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_feeds_list_scoped_posts(self):
+        """Ленты содержат посты своей области"""
+        cases = {
+            reverse('index_rss'): ('В группе', 'Вне группы'),
+            reverse('group_atom', args=['group']): ('В группе',),
+            reverse('profile_rss', args=['Author']): ('В группе',
+                                                      'Вне группы'),
+        }
+        for url, texts in cases.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                for text in texts:
+                    self.assertContains(response, text)
+        response = self.client.get(reverse('group_rss', args=['group']))
+        self.assertNotContains(response, 'Вне группы')
+
+    def test_poll_without_changes_is_free(self):
+        """Повторный опрос: 304 по ETag и кэш ответа без запросов к базе"""
+        url = reverse('group_rss', args=['group'])
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 0)
+
+    def test_new_post_invalidates_feed(self):
+        """Новый пост в группе обновляет её ленту"""
+        url = reverse('group_rss', args=['group'])
+        etag = self.client.get(url)['ETag']
+        Post.objects.create(text='Свежий пост', author=TestFeeds.author,
+                            group=TestFeeds.group)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Свежий пост')
+
+    def test_unknown_group_is_404(self):
+        """Лента несуществующего сообщества — 404"""
+        response = self.client.get(reverse('group_rss', args=['missing']))
+        self.assertEqual(response.status_code, 404)
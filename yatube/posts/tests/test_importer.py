@@ -0,0 +1,149 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import cache_tags, importer, search
+from ..models import (Comment, Follow, Group, ImportedPost, Post,
+                      TimelineEntry, User)
+
+
+class TestImportCommand(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+
+    def load(self, content, suffix='.jsonl', **options):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w', encoding='utf-8') as file:
+            file.write(content)
+        self.addCleanup(os.remove, path)
+        call_command('import_yatube', path, stdout=StringIO(), **options)
+
+    def jsonl(self, *records):
+        return ''.join(json.dumps(record) + '\n' for record in records)
+
+    def records(self):
+        return self.jsonl(
+            {'type': 'follow', 'user': 'Reader', 'author': 'Author'},
+            {'type': 'post', 'id': 500, 'text': 'Старый пост про котов',
+             'author': 'Author', 'group': 'group',
+             'pub_date': '2015-03-01T10:00:00'},
+            {'type': 'comment', 'post': 500, 'author': 'Reader',
+             'text': 'Помню его', 'created': '2015-03-02T10:00:00'},
+            {'type': 'post', 'text': 'Без автора', 'author': 'Nobody'},
+        )
+
+    def imported(self, source_id):
+        return ImportedPost.objects.get(source_id=source_id).post
+
+    def check_loaded(self):
+        post = self.imported(500)
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.group, TestImportCommand.group)
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(Comment.objects.get().created.day, 2)
+        stats = User.objects.get(username='Author').stats
+        self.assertEqual((stats.posts, stats.followers), (1, 1))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=TestImportCommand.reader, post=post
+        ).exists())
+        self.assertEqual(list(search.search_posts('котов')), [post])
+        self.assertFalse(User.objects.filter(username='Nobody').exists())
+
+    def test_import_maintains_counters_per_batch(self):
+        """Пачки сразу обновляют счётчики, ленты и поиск"""
+        self.load(self.records(), batch_size=1)
+        self.check_loaded()
+
+    def test_deferred_import(self):
+        """С --defer обслуживание выполняется в конце"""
+        self.load(self.records(), defer=True)
+        self.check_loaded()
+        post = self.imported(500)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(list(search.search_posts('текст')), [post])
+
+    def test_csv_with_missing_authors_created(self):
+        """CSV одного вида; неизвестные авторы и группы создаются"""
+        self.load('author,text,group\nNewcomer,Привет,fresh\n',
+                  suffix='.csv', type='post', create_missing=True)
+        post = Post.objects.get()
+        self.assertEqual(post.author.username, 'Newcomer')
+        self.assertEqual(post.group.slug, 'fresh')
+
+    def test_repeated_import_skips_duplicates(self):
+        """Повторная загрузка не дублирует посты и подписки"""
+        self.load(self.records())
+        self.load(self.records())
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_broken_records_are_counted(self):
+        """Битые строки, ключи и даты считаются ошибками, загрузка идёт"""
+        content = '{"type": "post", "text": "Обрыв\n' + self.jsonl(
+            {'type': 'post', 'id': 'x', 'author': 'Author'},
+            {'type': 'post', 'author': 'Author', 'pub_date': 'вчера'},
+            {'type': 'comment', 'post': 'один', 'author': 'Reader'},
+            {'type': 'post', 'text': 'Целый', 'author': 'Author'},
+        )
+        stats = importer.Importer(batch_size=1).run(
+            importer.read_records(StringIO(content), 'jsonl')
+        )
+        self.assertEqual((stats['errors'], stats['posts']), (4, 1))
+        self.assertTrue(Post.objects.filter(text='Целый').exists())
+
+    def test_site_posts_during_import(self):
+        """Посты, созданные сайтом во время загрузки, не мешают ключам"""
+        def records():
+            yield {'type': 'post', 'text': 'Первый', 'author': 'Author'}
+            site_post = Post.objects.create(text='С сайта',
+                                            author=TestImportCommand.author)
+            # Загрузка не выключает auto_now_add у постов сайта
+            self.assertIsNotNone(site_post.pub_date)
+            yield {'type': 'post', 'text': 'Второй', 'author': 'Author'}
+
+        stats = importer.Importer(batch_size=1).run(records())
+        self.assertEqual(stats['posts'], 2)
+        self.assertEqual(Post.objects.count(), 3)
+
+    def test_source_id_of_site_post(self):
+        """id из файла, занятый постом сайта, не склеивает посты"""
+        site_post = Post.objects.create(text='С сайта',
+                                        author=TestImportCommand.author)
+        self.load(self.jsonl(
+            {'type': 'post', 'id': site_post.pk, 'text': 'Из файла',
+             'author': 'Author'},
+            {'type': 'comment', 'post': site_post.pk, 'author': 'Reader',
+             'text': 'К посту из файла'},
+        ))
+        post = self.imported(site_post.pk)
+        self.assertNotEqual(post, site_post)
+        self.assertEqual(post.text, 'Из файла')
+        self.assertEqual(Comment.objects.get().post, post)
+        self.assertFalse(site_post.comments.exists())
+
+    def test_import_bumps_affected_pages(self):
+        """Загрузка инвалидирует страницы авторов, групп и постов"""
+        self.load(self.records())
+        tags = ('author:Author', 'group:group',
+                f'post:{self.imported(500).pk}')
+        before = cache_tags.versions(*tags)
+        self.load(self.jsonl(
+            {'type': 'comment', 'post': 500, 'author': 'Reader',
+             'text': 'Ещё комментарий'},
+            {'type': 'post', 'text': 'Новый', 'author': 'Author',
+             'group': 'group'},
+        ))
+        after = cache_tags.versions(*tags)
+        for tag, old, new in zip(tags, before, after):
+            with self.subTest(tag=tag):
+                self.assertGreater(new, old)
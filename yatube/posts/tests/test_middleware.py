@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, User
+
+
+class TestAnonymousPageCache(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.other = User.objects.create_user(username='Other')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.post = Post.objects.create(text='Первый пост', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def get(self, name, **kwargs):
+        return self.guest_client.get(reverse(name, kwargs=kwargs))
+
+    def test_repeated_request_is_served_from_cache(self):
+        """Повторный анонимный запрос не доходит до view"""
+        first = self.get('group', slug='group')
+        self.assertIsNotNone(first.context)
+        second = self.get('group', slug='group')
+        self.assertIsNone(second.context)
+        self.assertEqual(first.content, second.content)
+
+    def test_write_invalidates_only_affected_pages(self):
+        """Пост другого автора без группы не сбрасывает страницу группы"""
+        self.get('index')
+        self.get('group', slug='group')
+        self.get('profile', username='Author')
+        Post.objects.create(text='Чужой пост',
+                            author=TestAnonymousPageCache.other)
+        self.assertIsNone(self.get('group', slug='group').context)
+        self.assertIsNone(self.get('profile', username='Author').context)
+        self.assertIsNotNone(self.get('index').context)
+
+    def test_comment_invalidates_post_page(self):
+        """Комментарий сбрасывает кэш страницы поста"""
+        kwargs = {'username': 'Author',
+                  'post_id': TestAnonymousPageCache.post.pk}
+        self.get('post', **kwargs)
+        Comment.objects.create(post=TestAnonymousPageCache.post,
+                               author=TestAnonymousPageCache.other,
+                               text='Новый комментарий')
+        response = self.get('post', **kwargs)
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_authorized_user_is_not_cached(self):
+        """Страницы авторизованных пользователей не кэшируются"""
+        client = Client()
+        client.force_login(TestAnonymousPageCache.author)
+        client.get(reverse('index'))
+        self.assertIsNotNone(client.get(reverse('index')).context)
@@ -0,0 +1,119 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import rollups
+from ..models import Comment, Group, GroupDailyStats, Post, User
+
+
+class TestGroupRollups(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.ann = User.objects.create_user(username='ann')
+        self.bob = User.objects.create_user(username='bob')
+        self.cats = Group.objects.create(title='Коты', slug='cats',
+                                         description='Про котов')
+        self.dogs = Group.objects.create(title='Собаки', slug='dogs',
+                                         description='Про собак')
+
+    def today(self, group):
+        row = GroupDailyStats.objects.get(group=group,
+                                          day=timezone.localdate())
+        return row.posts, row.comments, row.authors
+
+    def snapshot(self):
+        return sorted(GroupDailyStats.objects.values_list(
+            'group_id', 'day', 'posts', 'comments', 'authors'))
+
+    def test_counts_follow_posts_and_comments(self):
+        """Сводка дня сдвигается при создании и удалении записей"""
+        first = Post.objects.create(text='Первый', author=self.ann,
+                                    group=self.cats)
+        Post.objects.create(text='Второй', author=self.ann, group=self.cats)
+        comment = Comment.objects.create(post=first, author=self.bob,
+                                         text='Мяу')
+        self.assertEqual(self.today(self.cats), (2, 1, 2))
+        comment.delete()
+        self.assertEqual(self.today(self.cats), (2, 0, 1))
+        first.delete()
+        self.assertEqual(self.today(self.cats), (1, 0, 1))
+
+    def test_moved_post_and_rebuild(self):
+        """Перенос поста пересчитывает оба сообщества, как полная сборка"""
+        post = Post.objects.create(text='Текст', author=self.ann,
+                                   group=self.cats)
+        Comment.objects.create(post=post, author=self.bob, text='Гав')
+        post.group = self.dogs
+        post.save()
+        self.assertFalse(GroupDailyStats.objects.filter(
+            group=self.cats).exists())
+        self.assertEqual(self.today(self.dogs), (1, 1, 2))
+        incremental = self.snapshot()
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_latest_posts_single_query(self):
+        """Последний пост всех сообществ выбирается одним запросом"""
+        Post.objects.create(text='Старый', author=self.ann, group=self.cats)
+        newest = Post.objects.create(text='Новый', author=self.bob,
+                                     group=self.cats)
+        other = Post.objects.create(text='Другой', author=self.ann,
+                                    group=self.dogs)
+        with CaptureQueriesContext(connection) as queries:
+            latest = rollups.latest_posts([self.cats.pk, self.dogs.pk])
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(latest, {self.cats.pk: newest,
+                                  self.dogs.pk: other})
+
+    def test_directory_and_group_header(self):
+        """Каталог и шапка сообщества показывают суммы сводок"""
+        post = Post.objects.create(text='Текст', author=self.ann,
+                                   group=self.cats)
+        Comment.objects.create(post=post, author=self.bob, text='Мяу')
+        response = self.client.get(reverse('groups'))
+        groups = {group.slug: group for group in response.context['page']}
+        self.assertEqual(set(groups), {'cats', 'dogs'})
+        cats = groups['cats']
+        self.assertEqual(
+            (cats.total_posts, cats.total_comments, cats.active_authors),
+            (1, 1, 2)
+        )
+        self.assertEqual(cats.latest_post, post)
+        self.assertIsNone(groups['dogs'].latest_post)
+        response = self.client.get(reverse('group', args=['cats']))
+        self.assertEqual(response.context['group'].total_posts, 1)
+        self.assertContains(response, 'активных авторов: 2')
+
+    def test_post_delete_does_not_forget_each_comment(self):
+        """Удаление поста не пересчитывает сводки на каждый комментарий"""
+        def delete_queries(comments):
+            post = Post.objects.create(text='Обсуждаемый', author=self.ann,
+                                       group=self.cats)
+            for i in range(comments):
+                Comment.objects.create(post=post, author=self.bob,
+                                       text=f'Комментарий {i}')
+            with CaptureQueriesContext(connection) as queries:
+                post.delete()
+            return len(queries)
+
+        self.assertEqual(delete_queries(1), delete_queries(5))
+        self.assertFalse(GroupDailyStats.objects.exists())
+
+    def test_group_page_validator_changes_daily(self):
+        """Окно активных авторов сдвигается, и ETag страницы меняется"""
+        url = reverse('group', kwargs={'slug': 'cats'})
+        etag = self.client.get(url)['ETag']
+        tomorrow = timezone.localdate() + datetime.timedelta(days=1)
+        with mock.patch('django.utils.timezone.localdate',
+                        return_value=tomorrow):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
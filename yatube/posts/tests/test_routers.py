@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache, caches
+from django.db import router
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+
+from .. import cache_tags
+from ..models import Comment, Post, User, UserStats
+from ..routers import replica_reads
+
+
+@replica_reads
+def read_alias(request):
+    return HttpResponse(router.db_for_read(Post))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class TestReplicaRouting(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def forget_writes(self, *tags):
+        shared = caches[settings.CACHE_TAGS_ALIAS]
+        shared.set_many({
+            cache_tags.VERSION_KEY.format(name): 0
+            for tag in tags for name in (tag, cache_tags.row_tag(tag))
+        })
+
+    def test_pages_read_replica(self):
+        """GET страницы читает реплику, всё остальное — основную базу"""
+        self.assertEqual(
+            read_alias(self.factory.get('/')).content, b'replica'
+        )
+        self.assertEqual(
+            read_alias(self.factory.post('/')).content, b'default'
+        )
+        self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertEqual(router.db_for_write(Post), 'default')
+
+    def test_sticky_cookie_reads_primary(self):
+        """После записи страницы читают основную базу"""
+        request = self.factory.get('/')
+        request.COOKIES[settings.REPLICA_STICKY_COOKIE] = '1'
+        self.assertEqual(read_alias(request).content, b'default')
+
+    def test_fresh_writes_read_primary(self):
+        """Страница, в области которой только что писали, читает основную"""
+        request = self.factory.get('/')
+        request.user = AnonymousUser()
+        request.resolver_match = resolve(reverse('index'))
+        self.forget_writes('feed')
+        self.assertEqual(read_alias(request).content, b'replica')
+        cache_tags.bump('feed')
+        self.assertEqual(read_alias(request).content, b'default')
+
+    def test_comments_keep_feed_on_replica(self):
+        """Комментарий не переводит ленту на основную базу"""
+        author = User.objects.create_user(username='Author')
+        post = Post.objects.create(text='Пост', author=author)
+        request = self.factory.get('/')
+        request.user = AnonymousUser()
+        request.resolver_match = resolve(reverse('index'))
+        self.forget_writes('feed', f'post:{post.pk}', 'author:Author')
+        Comment.objects.create(post=post, author=author, text='Мнение')
+        self.assertEqual(read_alias(request).content, b'replica')
+        request.resolver_match = resolve(reverse(
+            'post', kwargs={'username': 'Author', 'post_id': post.pk}))
+        self.assertEqual(read_alias(request).content, b'default')
+
+
+# В тестах реплика — та же база, проверяется только cookie после записи
+@override_settings(DATABASE_REPLICAS=['default'])
+class TestStickyPrimary(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='writer')
+        self.client.force_login(self.user)
+        self.post = Post.objects.create(text='Текст', author=self.user)
+
+    def test_write_makes_reader_sticky(self):
+        """Комментарий ставит cookie чтения из основной базы, чтение — нет"""
+        response = self.client.get(reverse('index'))
+        self.assertNotIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+        response = self.client.post(
+            reverse('add_comment', args=['writer', self.post.pk]),
+            {'text': 'Комментарий'},
+        )
+        cookie = response.cookies[settings.REPLICA_STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_STICKY_SECONDS)
+        response = self.client.get(
+            reverse('post', args=['writer', self.post.pk])
+        )
+        self.assertContains(response, 'Комментарий')
+
+    def test_service_writes_do_not_make_sticky(self):
+        """Служебная запись при чтении страницы не ставит cookie"""
+        UserStats.objects.filter(user=self.user).delete()
+        response = self.client.get(reverse('profile', args=['writer']))
+        self.assertTrue(UserStats.objects.filter(user=self.user).exists())
+        self.assertNotIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
@@ -0,0 +1,79 @@
+from django.contrib.admin.sites import site
+from django.core.cache import cache
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from .. import search
+from ..models import Comment, Post, User
+
+
+class TestSearch(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Writer')
+        cls.once = Post.objects.create(
+            text='Заметка про котов и собак', author=cls.author
+        )
+        cls.often = Post.objects.create(
+            text='Коты, коты и снова коты', author=cls.author
+        )
+        Post.objects.create(text='Про погоду', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_results_ranked_by_relevance(self):
+        """Чаще встречающееся слово поднимает пост выше"""
+        response = self.client.get(reverse('search'), {'q': 'кот'})
+        self.assertEqual(list(response.context['page']),
+                         [TestSearch.often, TestSearch.once])
+
+    def test_index_follows_updates_and_deletes(self):
+        """Индекс обновляется при изменении и удалении поста"""
+        post = Post.objects.create(text='Единорог', author=TestSearch.author)
+        self.assertEqual(list(search.search_posts('единорог')), [post])
+        post.text = 'Пегас'
+        post.save()
+        self.assertFalse(search.search_posts('единорог').exists())
+        self.assertEqual(list(search.search_posts('пегас')), [post])
+        post.delete()
+        self.assertFalse(search.search_posts('пегас').exists())
+
+    @override_settings(PAGES=1)
+    def test_cursor_pages_keep_query(self):
+        """Курсор по (rank, id) ведёт на следующую страницу того же поиска"""
+        response = self.client.get(reverse('search'), {'q': 'кот'})
+        page = response.context['page']
+        self.assertContains(response, 'q=%D0%BA%D0%BE%D1%82&amp;after=')
+        response = self.client.get(reverse('search'), {
+            'q': 'кот', 'after': page.paginator.next_cursor,
+        })
+        self.assertEqual(list(response.context['page']), [TestSearch.once])
+
+    def test_query_operators_are_not_interpreted(self):
+        """Синтаксис FTS5 в запросе не вызывает ошибок"""
+        response = self.client.get(reverse('search'), {'q': 'кот" OR (*'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_empty_query_renders_empty_page(self):
+        """Страница поиска без слов в запросе открывается пустой"""
+        for params in ({}, {'q': ''}, {'q': '"'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('search'), params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(list(response.context['page']), [])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по индексу постов и комментариев"""
+        Comment.objects.create(post=TestSearch.once, author=TestSearch.author,
+                               text='Согласен насчёт собак')
+        request = RequestFactory().get('/')
+        for model, expected in ((Post, 1), (Comment, 1)):
+            model_admin = site._registry[model]
+            queryset, distinct = model_admin.get_search_results(
+                request, model.objects.all(), 'собак'
+            )
+            self.assertEqual(queryset.count(), expected)
+            self.assertFalse(distinct)
@@ -0,0 +1,65 @@
+import copy
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from ..sqlite import atomic_with_retry
+
+
+class TestPragmas(TestCase):
+    @override_settings(SQLITE_PRAGMAS=settings.SQLITE_PRODUCTION_PRAGMAS)
+    def test_production_pragmas_on_connect(self):
+        """Новое соединение переходит в WAL и получает прагмы профиля"""
+        with tempfile.TemporaryDirectory() as directory:
+            options = copy.deepcopy(connection.settings_dict)
+            options['NAME'] = os.path.join(directory, 'db.sqlite3')
+            wrapper = DatabaseWrapper(options, alias='pragmas')
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                    cursor.execute('PRAGMA synchronous')
+                    self.assertEqual(cursor.fetchone()[0], 1)
+                    cursor.execute('PRAGMA temp_store')
+                    self.assertEqual(cursor.fetchone()[0], 2)
+            finally:
+                wrapper.close()
+
+    def test_benchmark_reports_both_profiles(self):
+        """Сравнение выводит строку для каждого профиля"""
+        out = StringIO()
+        call_command('benchmark_sqlite', workers=2, seconds=0.2, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines[1:]],
+                         ['default', 'production'])
+
+
+@override_settings(SQLITE_WRITE_RETRIES=2, SQLITE_RETRY_DELAY=0)
+class TestWriteRetry(TransactionTestCase):
+    def flaky(self, failures, message='database is locked'):
+        calls = []
+
+        def write():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise OperationalError(message)
+            return len(calls)
+        return write
+
+    def test_locked_write_is_retried(self):
+        """Транзакция повторяется, пока база занята"""
+        self.assertEqual(atomic_with_retry(self.flaky(2)), 3)
+
+    def test_retries_are_limited(self):
+        """После исчерпания повторов и для других ошибок — исключение"""
+        with self.assertRaises(OperationalError):
+            atomic_with_retry(self.flaky(3))
+        write = self.flaky(1, message='no such table: posts_post')
+        with self.assertRaises(OperationalError):
+            atomic_with_retry(write)
@@ -0,0 +1,65 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import suggestions
+from ..models import Follow, FollowSuggestion, User
+
+
+class TestSuggestions(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        names = ('ann', 'bob', 'cat', 'dan', 'eve', 'fox')
+        cls.users = {name: User.objects.create_user(username=name)
+                     for name in names}
+        for user, author in (
+            ('ann', 'bob'), ('bob', 'cat'), ('bob', 'dan'),
+            ('eve', 'bob'), ('eve', 'fox'),
+        ):
+            Follow.objects.create(user=cls.users[user],
+                                  author=cls.users[author])
+
+    def setUp(self):
+        cache.clear()
+
+    def suggested(self, name):
+        return list(
+            FollowSuggestion.objects.filter(user=TestSuggestions.users[name])
+            .values_list('suggested__username', flat=True)
+        )
+
+    def test_friends_of_friends_rank_first(self):
+        """Друзья друзей выше со-подписок, подписки и сам читатель — нет"""
+        suggestions.build(batch_size=2, top_k=5, weight=0.5)
+        self.assertEqual(self.suggested('ann'), ['cat', 'dan', 'fox'])
+        self.assertNotIn('bob', self.suggested('eve'))
+        self.assertNotIn('eve', self.suggested('eve'))
+
+    def test_top_k_and_rebuild_replace_rows(self):
+        """Хранится не больше top_k строк, пересчёт заменяет старые"""
+        call_command('build_suggestions', top_k=1, stdout=StringIO())
+        self.assertEqual(self.suggested('ann'), ['cat'])
+        Follow.objects.filter(user=TestSuggestions.users['ann']).delete()
+        suggestions.build()
+        self.assertEqual(self.suggested('ann'), [])
+
+    def test_sidebar_single_query(self):
+        """Панель читает предложения одним запросом и скрывает подписки"""
+        suggestions.build(top_k=5)
+        ann = TestSuggestions.users['ann']
+        Follow.objects.create(user=ann, author=TestSuggestions.users['cat'])
+        with CaptureQueriesContext(connection) as queries:
+            names = [row.suggested.username
+                     for row in suggestions.for_user(ann)]
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(names, ['dan', 'fox'])
+        client = Client()
+        client.force_login(ann)
+        response = client.get(reverse('follow_index'))
+        self.assertContains(response, 'На кого подписаться')
@@ -0,0 +1,86 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Post, User
+from ..thumbnails import generate, ready_thumbnail
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TestThumbnails(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.post = Post.objects.create(
+            text='С картинкой',
+            author=cls.author,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF,
+                                     content_type='image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_template_falls_back_to_original(self):
+        """Пока миниатюры нет, в карточке показывается оригинал"""
+        self.assertIsNone(ready_thumbnail(TestThumbnails.post.image))
+        response = Client().get(reverse('index'))
+        self.assertContains(response, TestThumbnails.post.image.url)
+
+    def test_generated_thumbnail_is_used(self):
+        """После генерации карточка ссылается на миниатюру"""
+        generate(TestThumbnails.post.image.name)
+        thumbnail = ready_thumbnail(TestThumbnails.post.image)
+        self.assertIsNotNone(thumbnail)
+        response = Client().get(reverse('index'))
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, TestThumbnails.post.image.url)
+
+    def test_page_thumbnails_are_looked_up_in_one_query(self):
+        """Миниатюры всей страницы ищутся одним запросом"""
+        for i in range(3):
+            Post.objects.create(
+                text=f'Ещё картинка {i}',
+                author=TestThumbnails.author,
+                image=SimpleUploadedFile(f'small{i}.gif', SMALL_GIF,
+                                         content_type='image/gif'),
+            )
+        with CaptureQueriesContext(connection) as queries:
+            Client().get(reverse('index'))
+        lookups = [query for query in queries
+                   if 'thumbnail_kvstore' in query['sql']]
+        self.assertEqual(len(lookups), 1)
+
+    def test_command_builds_missing_thumbnails(self):
+        """Команда достраивает миниатюры, которые не построила очередь"""
+        Post.objects.create(text='Без картинки', author=TestThumbnails.author)
+        out = StringIO()
+        call_command('generate_thumbnails', batch_size=1, stdout=out)
+        self.assertIn('постов: 1', out.getvalue())
+        self.assertIsNotNone(ready_thumbnail(TestThumbnails.post.image))
+        call_command('generate_thumbnails', stdout=out)
+        self.assertIn('постов: 0', out.getvalue())
@@ -0,0 +1,186 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import metrics, timeline
+from ..models import Follow, Post, TimelineEntry, User, UserStats
+
+
+class TestTimeline(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.old_post = Post.objects.create(text='До подписки',
+                                           author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(TestTimeline.reader)
+
+    def test_follow_backfills_timeline(self):
+        """При подписке в ленту попадают уже написанные посты"""
+        self.client.get(reverse('profile_follow',
+                                kwargs={'username': TestTimeline.author}))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=TestTimeline.reader, post=TestTimeline.old_post).exists())
+
+    def test_new_post_fans_out(self):
+        """Новый пост записывается в ленты подписчиков"""
+        Follow.objects.create(user=TestTimeline.reader,
+                              author=TestTimeline.author)
+        post = Post.objects.create(text='После подписки',
+                                   author=TestTimeline.author)
+        entry = TimelineEntry.objects.get(user=TestTimeline.reader,
+                                          post=post)
+        self.assertEqual(entry.pub_date, post.pub_date)
+
+    def test_unfollow_trims_timeline(self):
+        """После отписки посты автора удаляются из ленты"""
+        Follow.objects.create(user=TestTimeline.reader,
+                              author=TestTimeline.author)
+        self.client.get(reverse('profile_unfollow',
+                                kwargs={'username': TestTimeline.author}))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=TestTimeline.reader).exists())
+
+    def test_rebuild_command(self):
+        """Команда rebuild_timelines восстанавливает ленты"""
+        Follow.objects.create(user=TestTimeline.reader,
+                              author=TestTimeline.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', batch_size=1, stdout=StringIO())
+        response = self.client.get(reverse('follow_index'))
+        self.assertEqual(response.context['page'][0], TestTimeline.old_post)
+
+    def test_rebuild_drops_stale_readers(self):
+        """Пересборка убирает ленты читателей без подписок"""
+        Follow.objects.create(user=TestTimeline.reader,
+                              author=TestTimeline.author)
+        Follow.objects.filter(user=TestTimeline.reader).delete()
+        TimelineEntry.objects.create(
+            user=TestTimeline.reader, post=TestTimeline.old_post,
+            author=TestTimeline.author, pub_date=TestTimeline.old_post.pub_date
+        )
+        self.assertEqual(timeline.rebuild(), 0)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_feed_reads_timeline_index(self):
+        """Страница ленты читается по индексу без сортировки"""
+        rows, _ = timeline.follow_feed(TestTimeline.reader)
+        sql, params = rows.order_by(
+            *timeline.FEED_ORDERING)[:11].query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('INDEX', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+@override_settings(FEED_FANOUT_THRESHOLD=1, FEED_FANOUT_LEAVE_THRESHOLD=1)
+class TestHybridTimeline(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create_user(username='Star')
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        fan = User.objects.create_user(username='Fan')
+        Follow.objects.create(user=fan, author=cls.star)
+        Follow.objects.create(user=cls.reader, author=cls.star)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(TestHybridTimeline.reader)
+
+    def test_popular_author_is_not_fanned_out(self):
+        """Посты автора выше порога не пишутся в ленты"""
+        post = Post.objects.create(text='Для всех',
+                                   author=TestHybridTimeline.star)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+
+    def test_feed_merges_pushed_and_pulled(self):
+        """Лента сливает свои строки и посты популярных авторов"""
+        posts = [
+            Post.objects.create(text=f'пост {i}', author=author)
+            for i, author in enumerate(
+                [TestHybridTimeline.author, TestHybridTimeline.star] * 6
+            )
+        ]
+        expected = sorted(posts, key=lambda post: (post.pub_date, post.id),
+                          reverse=True)
+        first = self.client.get(reverse('follow_index')).context['page']
+        self.assertEqual(list(first.object_list), expected[:10])
+        second = self.client.get(
+            reverse('follow_index'), {'after': first.paginator.next_cursor}
+        ).context['page']
+        self.assertEqual(list(second.object_list), expected[10:])
+        numbered = self.client.get(
+            reverse('follow_index'), {'page': 2}
+        ).context['page']
+        self.assertEqual(list(numbered.object_list), expected[10:])
+        self.assertGreater(
+            metrics.snapshot()['counters']['feed.merge.requests'], 0
+        )
+
+    def test_stale_pulled_set_still_fans_out(self):
+        """Устаревшее множество «тяжёлых» авторов не теряет посты"""
+        timeline.pulled_authors()
+        Follow.objects.filter(author=TestHybridTimeline.star,
+                              user__username='Fan').delete()
+        cache.set(timeline._pulled_key(),
+                  frozenset({TestHybridTimeline.star.pk}))
+        post = Post.objects.create(text='Снова в лентах',
+                                   author=TestHybridTimeline.star)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=TestHybridTimeline.reader, post=post).exists())
+
+    def test_leaving_pull_mode_backfills_followers(self):
+        """Автор ниже порога дописывает свои посты в ленты фоновой задачей"""
+        post = Post.objects.create(text='Для всех',
+                                   author=TestHybridTimeline.star)
+        with mock.patch('posts.timeline.background.on_commit') as on_commit:
+            Follow.objects.filter(author=TestHybridTimeline.star,
+                                  user__username='Fan').delete()
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=TestHybridTimeline.reader, post=post).exists())
+        key, func, *args = on_commit.call_args[0]
+        self.assertEqual(key,
+                         ('timeline_backfill', TestHybridTimeline.star.pk))
+        func(*args)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=TestHybridTimeline.reader, post=post).exists())
+        response = self.client.get(reverse('follow_index'))
+        self.assertEqual(response.context['page'][0], post)
+
+    @override_settings(FEED_FANOUT_LEAVE_THRESHOLD=0)
+    def test_pull_mode_hysteresis(self):
+        """Между порогами автор не меняет режим ни в одну сторону"""
+        fan = User.objects.get(username='Fan')
+        with mock.patch('posts.timeline.background.on_commit') as on_commit:
+            Follow.objects.filter(author=TestHybridTimeline.star,
+                                  user=fan).delete()
+            self.assertTrue(timeline.is_pulled(TestHybridTimeline.star.pk))
+            Follow.objects.create(user=fan, author=TestHybridTimeline.star)
+            Follow.objects.filter(author=TestHybridTimeline.star,
+                                  user=fan).delete()
+        on_commit.assert_not_called()
+        post = Post.objects.create(text='Для всех',
+                                   author=TestHybridTimeline.star)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+
+    def test_rebuild_syncs_pull_mode(self):
+        """Пересборка лент сверяет режимы авторов с порогами"""
+        UserStats.objects.filter(user=TestHybridTimeline.star).update(
+            pulled=False)
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertTrue(timeline.is_pulled(TestHybridTimeline.star.pk))
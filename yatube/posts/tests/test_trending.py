@@ -0,0 +1,114 @@
+import datetime
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import trending
+from ..models import (Comment, Follow, Group, Post, TrendingGroup,
+                      TrendingPost, User)
+
+HOUR = datetime.timedelta(hours=1)
+
+
+@override_settings(
+    TRENDING_HALF_LIFE_HOURS=1,
+    TRENDING_WEIGHTS={'post': 1.0, 'comment': 2.0, 'follow': 0.5},
+)
+class TestTrending(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.now = timezone.now()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+
+    def post(self, hours_ago, group=None):
+        post = Post.objects.create(text='Текст', author=self.author,
+                                   group=group)
+        Post.objects.filter(pk=post.pk).update(
+            pub_date=self.now - hours_ago * HOUR
+        )
+        return post
+
+    def score(self, post):
+        return TrendingPost.objects.get(pk=post.pk).score
+
+    def test_older_events_decay(self):
+        """Вклад события падает вдвое за период полураспада"""
+        fresh = self.post(0)
+        old = self.post(1)
+        trending.update(self.now)
+        self.assertAlmostEqual(self.score(fresh), 1.0)
+        self.assertAlmostEqual(self.score(old), 0.5)
+        self.assertEqual(trending.top_posts(), [fresh, old])
+
+    def test_incremental_update_matches_full(self):
+        """Затухание и новые события дают ту же оценку, что полный пересчёт"""
+        post = self.post(2, group=self.group)
+        trending.update(self.now - HOUR)
+        comment = Comment.objects.create(post=post, author=self.reader,
+                                         text='Комментарий')
+        Comment.objects.filter(pk=comment.pk).update(created=self.now)
+        trending.update(self.now)
+        self.assertAlmostEqual(self.score(post), 0.25 + 2.0)
+        group = TrendingGroup.objects.get(pk=self.group.pk)
+        self.assertAlmostEqual(group.score, 0.25 + 2.0)
+
+    def test_follow_boosts_author_posts_and_floor_drops(self):
+        """Новый подписчик поднимает посты автора, старые строки удаляются"""
+        post = self.post(1)
+        trending.update(self.now - HOUR)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.filter(pk=follow.pk).update(created=self.now)
+        trending.update(self.now)
+        self.assertAlmostEqual(self.score(post), 0.5 + 0.5)
+        trending.update(self.now + 20 * HOUR)
+        self.assertFalse(TrendingPost.objects.exists())
+
+    def test_pages(self):
+        """Страницы популярного берут посты из готовой таблицы"""
+        in_group = self.post(0, group=self.group)
+        other = self.post(0)
+        call_command('update_trending', stdout=StringIO())
+        response = self.client.get(reverse('trending'))
+        self.assertEqual(
+            set(response.context['posts']), {in_group, other}
+        )
+        self.assertEqual(
+            [row.group for row in response.context['groups']], [self.group]
+        )
+        response = self.client.get(
+            reverse('group_trending', args=[self.group.slug])
+        )
+        self.assertEqual(response.context['posts'], [in_group])
+        response = self.client.get(reverse('group_trending', args=['none']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_moved_post_follows_its_group(self):
+        """Перенесённый пост сразу уходит со страницы старого сообщества"""
+        post = self.post(0, group=self.group)
+        trending.update(self.now)
+        other = Group.objects.create(title='Другая', slug='other',
+                                     description='Описание')
+        post.group = other
+        post.save()
+        self.assertEqual(trending.top_posts(self.group), [])
+        self.assertEqual(trending.top_posts(other), [post])
+
+    def test_post_edit_changes_page_validator(self):
+        """Правка поста меняет ETag страницы популярного до пересчёта"""
+        post = self.post(0)
+        call_command('update_trending', stdout=StringIO())
+        etag = self.client.get(reverse('trending'))['ETag']
+        post.text = 'Исправленный текст'
+        post.save()
+        response = self.client.get(reverse('trending'),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Исправленный текст')
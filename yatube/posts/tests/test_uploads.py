@@ -0,0 +1,104 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def jpeg_upload(name, size, exif=None):
+    buffer = BytesIO()
+    options = {'exif': exif.tobytes()} if exif is not None else {}
+    Image.new('RGB', size, color=(20, 120, 200)).save(buffer, 'JPEG',
+                                                      **options)
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   POST_IMAGE_MAX_EDGE=400,
+                   POST_IMAGE_MAX_PIXELS=1_000_000,
+                   POST_IMAGE_MAX_BYTES=1024 * 1024)
+class TestImageIngest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(TestImageIngest.user)
+
+    def upload(self, image):
+        return self.client.post(reverse('new_post'),
+                                {'text': 'Снимок', 'image': image})
+
+    def test_oversized_image_is_downscaled(self):
+        """Большая сторона уменьшается до POST_IMAGE_MAX_EDGE"""
+        self.upload(jpeg_upload('wide.jpg', (800, 600)))
+        post = Post.objects.get()
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (400, 300))
+
+    def test_exif_is_stripped(self):
+        """EXIF не сохраняется, ориентация применяется к пикселям"""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # повернуть на 90° по часовой
+        exif[0x010F] = 'Camera'
+        self.upload(jpeg_upload('phone.jpg', (300, 200), exif=exif))
+        post = Post.objects.get()
+        with Image.open(post.image.path) as stored:
+            self.assertNotIn('exif', stored.info)
+            self.assertEqual(stored.size, (200, 300))
+
+    def test_mpo_is_handled_as_jpeg(self):
+        """Снимок MPO уменьшается и сохраняется как JPEG без EXIF"""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        frames = [Image.new('RGB', (800, 600), color) for color in
+                  ((20, 120, 200), (200, 120, 20))]
+        buffer = BytesIO()
+        frames[0].save(buffer, 'MPO', save_all=True,
+                       append_images=frames[1:], exif=exif.tobytes())
+        self.upload(SimpleUploadedFile('stereo.jpg', buffer.getvalue(),
+                                       content_type='image/jpeg'))
+        post = Post.objects.get()
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.format, 'JPEG')
+            self.assertEqual(stored.size, (400, 300))
+            self.assertNotIn('exif', stored.info)
+
+    def test_small_image_is_stored_as_is(self):
+        """Картинка в пределах лимитов не перекодируется"""
+        upload = jpeg_upload('small.jpg', (200, 100))
+        original = upload.read()
+        upload.seek(0)
+        self.upload(upload)
+        post = Post.objects.get()
+        with open(post.image.path, 'rb') as stored:
+            self.assertEqual(stored.read(), original)
+
+    def test_too_many_pixels_rejected(self):
+        """Картинка с огромным числом пикселей отклоняется по заголовку"""
+        response = self.upload(jpeg_upload('bomb.jpg', (1200, 1000)))
+        self.assertFalse(Post.objects.exists())
+        self.assertTrue(response.context['form'].errors['image'])
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024)
+    def test_too_many_bytes_rejected(self):
+        """Файл больше POST_IMAGE_MAX_BYTES отклоняется во время загрузки"""
+        response = self.upload(jpeg_upload('heavy.jpg', (300, 300)))
+        self.assertFalse(Post.objects.exists())
+        errors = response.context['form'].errors['image']
+        self.assertIn('Файл больше', errors[0])
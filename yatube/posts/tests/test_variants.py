@@ -0,0 +1,81 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import imaging, variants
+from ..models import ImageVariant, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_upload(name, size):
+    buffer = BytesIO()
+    Image.new('RGB', size, color=(200, 30, 30)).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   POST_IMAGE_WIDTHS=(480, 960, 1440),
+                   POST_IMAGE_FORMATS=('avif', 'webp'))
+class TestImageVariants(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.post = Post.objects.create(
+            text='С картинкой', author=cls.author,
+            image=image_upload('photo.jpg', (1000, 700)),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_build_records_supported_variants(self):
+        """Варианты строятся для ширин не больше исходной"""
+        variants.build(TestImageVariants.post.pk)
+        formats = imaging.supported_formats(('avif', 'webp'))
+        recorded = set(ImageVariant.objects.filter(
+            post=TestImageVariants.post
+        ).values_list('format', 'width', 'height'))
+        self.assertEqual(recorded, {
+            (fmt, width, round(width * 339 / 960))
+            for fmt in formats for width in (480, 960)
+        })
+
+    def test_card_renders_srcset(self):
+        """Карточка поста выводит <source> с srcset"""
+        ImageVariant.objects.create(post=TestImageVariants.post,
+                                    format='webp', width=480, height=170,
+                                    image='posts/variants/1-480.webp')
+        response = Client().get(reverse('index'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, '/media/posts/variants/1-480.webp 480w')
+
+    def test_cleared_image_drops_variants(self):
+        """После удаления картинки старые варианты не показываются"""
+        post = Post.objects.create(
+            text='Сменит картинку', author=TestImageVariants.author,
+            image=image_upload('old.jpg', (600, 400)),
+        )
+        ImageVariant.objects.create(post=post, format='webp', width=480,
+                                    height=170, image='posts/variants/x.webp')
+        client = Client()
+        client.force_login(TestImageVariants.author)
+        client.post(
+            reverse('post_edit', kwargs={'username': 'Author',
+                                         'post_id': post.pk}),
+            {'text': post.text, 'image-clear': 'on'},
+        )
+        self.assertFalse(ImageVariant.objects.filter(post=post).exists())
@@ -1,9 +1,14 @@
-from django.core.cache import cache
+from django.conf import settings
+from django.core.cache import cache, caches
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.db import IntegrityError, connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Follow, Group, Post, User
+from .. import cache_tags
+from ..models import Comment, Follow, Group, Post, User
+from ..paginator import encode_cursor
 
 
 class TestViewsContext(TestCase):
@@ -147,6 +152,7 @@ class TestPaginator(TestCase):
             i += 1
 
     def setUp(self):
+        cache.clear()
         self.client = Client()
 
     def test_first_page_contains_10_records(self):
@@ -159,6 +165,38 @@ class TestPaginator(TestCase):
         response = self.client.get(reverse('index') + '?page=2')
         self.assertEqual(len(response.context.get('page').object_list), 3)
 
+    def test_cursor_pages(self):
+        """Переход по курсору вперёд и назад возвращает те же записи"""
+        first = self.client.get(reverse('index')).context['page']
+        self.assertTrue(first.has_next())
+        self.assertFalse(first.has_previous())
+        second = self.client.get(
+            reverse('index'), {'after': first.paginator.next_cursor}
+        ).context['page']
+        self.assertEqual(len(second.object_list), 3)
+        self.assertFalse(second.has_next())
+        self.assertTrue(second.has_previous())
+        back = self.client.get(
+            reverse('index'), {'before': second.paginator.previous_cursor}
+        ).context['page']
+        self.assertEqual(list(back.object_list), list(first.object_list))
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор отдаёт первую страницу"""
+        tokens = ['garbage!', encode_cursor(['2020-01-01', 2 ** 64]),
+                  encode_cursor(['2020-01-01', [1]]),
+                  encode_cursor([{}, 1])]
+        for url in (reverse('index'), reverse('search')):
+            for token in tokens:
+                with self.subTest(url=url, token=token):
+                    response = self.client.get(
+                        url, {'q': 'text', 'after': token})
+                    self.assertEqual(response.status_code, 200)
+                    page = response.context['page']
+                    self.assertFalse(page.has_previous())
+        response = self.client.get(reverse('index'), {'after': tokens[1]})
+        self.assertEqual(len(response.context['page'].object_list), 10)
+
 
 class TestCashe(TestCase):
     @classmethod
@@ -180,6 +218,59 @@ class TestCashe(TestCase):
         cache.clear()
         self.assertNotEqual(cached_response_content, response.content)
 
+    def test_cached_fragment_skips_feed_query(self):
+        """Повторный запрос главной берёт ленту из кэша"""
+        cache.clear()
+        TestCashe.guest_client.get(reverse('index'))
+        with CaptureQueriesContext(connection) as queries:
+            TestCashe.guest_client.get(reverse('index'))
+        self.assertFalse(
+            any('posts_post' in query['sql'] for query in queries)
+        )
+
+    def test_follow_fragment_is_personal(self):
+        """Фрагмент ленты подписок не попадает на главную"""
+        cache.clear()
+        reader = User.objects.create_user(username='Reader')
+        client = Client()
+        client.force_login(reader)
+        follow_page = client.get(reverse('follow_index'))
+        self.assertNotContains(follow_page, TestCashe.post.text)
+        index_page = client.get(reverse('index'))
+        self.assertContains(index_page, TestCashe.post.text)
+        Follow.objects.create(user=reader, author=TestCashe.author)
+        follow_page = client.get(reverse('follow_index'))
+        self.assertContains(follow_page, TestCashe.post.text)
+
+    def test_follow_fragment_keyed_on_followed_authors(self):
+        """Пост чужого автора не сбрасывает фрагмент ленты подписок"""
+        reader = User.objects.create_user(username='Reader')
+        stranger = User.objects.create_user(username='Stranger')
+        Follow.objects.create(user=reader, author=TestCashe.author)
+        client = Client()
+        client.force_login(reader)
+        key = client.get(reverse('follow_index')).context['fragment_key']
+        Post.objects.create(text='Чужой пост', author=stranger)
+        self.assertEqual(
+            client.get(reverse('follow_index')).context['fragment_key'], key
+        )
+        Post.objects.create(text='Свой пост', author=TestCashe.author)
+        self.assertNotEqual(
+            client.get(reverse('follow_index')).context['fragment_key'], key
+        )
+
+    def test_tag_versions_are_shared(self):
+        """Версии тегов лежат в общем кэше, а не в кэше процесса"""
+        cache_tags.bump('feed')
+        version = cache_tags.versions('feed')
+        cache.clear()
+        self.assertEqual(cache_tags.versions('feed'), version)
+        self.assertEqual(cache_tags.check_shared_store(None), [])
+        local = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+        with override_settings(CACHES={'default': local, 'tags': local}):
+            self.assertEqual(cache_tags.check_shared_store(None)[0].id,
+                             'posts.W001')
+
 
 class TestFollow(TestCase):
     @classmethod
@@ -265,3 +356,265 @@ class TestFollow(TestCase):
         self.assertFalse(Follow.objects.filter(
             user=TestFollow.author, author=TestFollow.author).exists()
         )
+
+
+def query_plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return ' '.join(str(row) for row in cursor.fetchall())
+
+
+class TestFeedQueries(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(TestFeedQueries.author)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_feed_queries_do_not_grow_with_posts(self):
+        """Число запросов ленты не зависит от количества постов"""
+        urls = [
+            reverse('index'),
+            reverse('group', kwargs={'slug': TestFeedQueries.group.slug}),
+            reverse('profile', kwargs={'username': TestFeedQueries.author}),
+        ]
+        Post.objects.create(text='первый', author=TestFeedQueries.author,
+                            group=TestFeedQueries.group)
+        single = {url: self.count_queries(url) for url in urls}
+        for i in range(9):
+            Post.objects.create(text=f'ещё {i}',
+                                author=TestFeedQueries.author,
+                                group=TestFeedQueries.group)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), single[url])
+
+    def test_profile_reads_author_index(self):
+        """Страница профиля читается по индексу автора без сортировки"""
+        for cursor in ({}, {'pub_date__lt': '2020-01-01'}):
+            with self.subTest(cursor=cursor):
+                plan = query_plan(
+                    TestFeedQueries.author.posts.for_feed().filter(**cursor)
+                    .order_by('-pub_date', '-id')[:11]
+                )
+                self.assertIn('INDEX', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+
+@override_settings(COMMENTS_PER_PAGE=3)
+class TestPostDetail(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.post = Post.objects.create(text='Обсуждаемый пост',
+                                       author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(TestPostDetail.author)
+        self.url = reverse('post', kwargs={
+            'username': TestPostDetail.author.username,
+            'post_id': TestPostDetail.post.pk,
+        })
+
+    def comment(self, count, start=0):
+        for i in range(start, start + count):
+            commenter = User.objects.create_user(username=f'reader{i}')
+            Comment.objects.create(post=TestPostDetail.post,
+                                   author=commenter, text=f'Мнение {i}')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_comments(self):
+        """Число запросов страницы поста не зависит от комментариев"""
+        self.comment(1)
+        single = self.count_queries(self.url)
+        self.comment(6, start=1)
+        self.assertEqual(self.count_queries(self.url), single)
+
+    def test_comments_read_post_index(self):
+        """Комментарии к посту читаются по индексу без сортировки"""
+        plan = query_plan(
+            TestPostDetail.post.comments.select_related('author')
+            .order_by('-created', '-id')[:4]
+        )
+        self.assertIn('INDEX', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_load_more_returns_next_comments(self):
+        """«Показать ещё» отдаёт следующую порцию комментариев"""
+        self.comment(5)
+        response = self.client.get(self.url)
+        comments = response.context['comments']
+        self.assertNotIn('comment', response.context)
+        self.assertEqual([item.text for item in comments],
+                         ['Мнение 4', 'Мнение 3', 'Мнение 2'])
+        more = reverse('post_comments', kwargs={
+            'username': TestPostDetail.author.username,
+            'post_id': TestPostDetail.post.pk,
+        })
+        response = self.client.get(
+            more, {'after': comments.paginator.next_cursor}
+        )
+        self.assertTemplateUsed(response, 'includes/comment_list.html')
+        self.assertEqual([item.text for item in response.context['comments']],
+                         ['Мнение 1', 'Мнение 0'])
+        self.assertNotContains(response, 'data-load-more')
+
+
+class TestConditionalPages(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(TestConditionalPages.reader)
+
+    def urls(self):
+        return [
+            reverse('index'),
+            reverse('profile', kwargs={'username': 'Author'}),
+            reverse('post', kwargs={'username': 'Author',
+                                    'post_id': TestConditionalPages.post.pk}),
+        ]
+
+    def test_unchanged_page_is_not_modified(self):
+        """Без изменений страница отдаётся как 304 без запросов за постами"""
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response.has_header('Last-Modified'))
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(any('posts_post' in query['sql']
+                                     for query in queries))
+
+    def test_comment_changes_validator(self):
+        """Новый комментарий меняет ETag ленты, профиля и поста"""
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls()}
+        Comment.objects.create(post=TestConditionalPages.post,
+                               author=TestConditionalPages.reader,
+                               text='Комментарий')
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_group_rename_changes_validator(self):
+        """Новое название сообщества меняет ETag профиля и поста"""
+        group = Group.objects.create(title='Старое', slug='renamed',
+                                     description='')
+        post = TestConditionalPages.post
+        post.group = group
+        post.save()
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls()}
+        group.title = 'Новое'
+        group.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertContains(response, 'Новое')
+
+    def test_validators_follow_writes_of_other_workers(self):
+        """ETag и Last-Modified видят запись, сделанную другим процессом"""
+        url = reverse('profile', kwargs={'username': 'Author'})
+        first = self.client.get(url)
+        key = cache_tags.VERSION_KEY.format('author:Author')
+        # Другой воркер пишет версию тега только в общий кэш
+        shared = caches[settings.CACHE_TAGS_ALIAS]
+        shared.set(key, shared.get(key) + 2000)
+        cache.clear()
+        for header, value in (('HTTP_IF_NONE_MATCH', first['ETag']),
+                              ('HTTP_IF_MODIFIED_SINCE',
+                               first['Last-Modified'])):
+            with self.subTest(header=header):
+                response = self.client.get(url, **{header: value})
+                self.assertEqual(response.status_code, 200)
+
+    def test_validator_is_personal(self):
+        """ETag страницы отличается у разных пользователей"""
+        url = reverse('profile', kwargs={'username': 'Author'})
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(TestConditionalPages.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(PAGES=2)
+class TestFollowLists(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.readers = [User.objects.create_user(username=f'reader{i}')
+                       for i in range(3)]
+        for reader in cls.readers:
+            Follow.objects.create(user=reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_follow_is_unique(self):
+        """Повторная подписка на того же автора невозможна"""
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=TestFollowLists.readers[0],
+                                  author=TestFollowLists.author)
+
+    def test_followers_pages(self):
+        """Подписчики листаются курсором от новых к старым"""
+        url = reverse('followers', kwargs={'username': 'Author'})
+        page = self.client.get(url).context['page']
+        self.assertEqual([follow.person.username for follow in page],
+                         ['reader2', 'reader1'])
+        page = self.client.get(
+            url, {'after': page.paginator.next_cursor}
+        ).context['page']
+        self.assertEqual([follow.person.username for follow in page],
+                         ['reader0'])
+
+    def test_following_page(self):
+        """Страница подписок показывает авторов"""
+        url = reverse('following', kwargs={'username': 'reader0'})
+        page = self.client.get(url).context['page']
+        self.assertEqual([follow.person for follow in page],
+                         [TestFollowLists.author])
+
+    def test_queries_do_not_grow_with_followers(self):
+        """Число запросов не зависит от числа подписчиков"""
+        url = reverse('followers', kwargs={'username': 'Author'})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        before = len(queries)
+        for i in range(3, 8):
+            reader = User.objects.create_user(username=f'reader{i}')
+            Follow.objects.create(user=reader, author=TestFollowLists.author)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertEqual(len(queries), before)
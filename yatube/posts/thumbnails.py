@@ -0,0 +1,143 @@
+"""Миниатюры картинок постов, подготовленные заранее.
+
+Миниатюры всех размеров из ``settings.POST_THUMBNAILS`` строятся
+фоновой задачей после сохранения поста, а шаблоны только
+ищут готовую миниатюру в хранилище ключей sorl-thumbnail и до её
+появления показывают оригинал. Задачи, отброшенные переполненной
+очередью, и картинки, загруженные до появления миниатюр, достраивает
+команда ``generate_thumbnails`` (``build_missing``).
+"""
+from django.conf import settings
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import background
+from .models import Post
+
+
+class LookupBackend(ThumbnailBackend):
+    """Вычисляет имя миниатюры так же, как ``get_thumbnail``,
+    но ничего не читает и не создаёт."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+
+backend = LookupBackend()
+
+
+def ready_thumbnail(file_, preset='card'):
+    """Готовая миниатюра или None, если она ещё не построена."""
+    if not file_:
+        return None
+    geometry, options = settings.POST_THUMBNAILS[preset]
+    return default.kvstore.get(
+        backend.thumbnail_file(file_, geometry, **options)
+    )
+
+
+def _lookup_many(keys):
+    """Сырые значения хранилища sorl для ключей одним multi-get.
+
+    Промахи кэша дочитываются из таблицы одним запросом и, как в самом
+    sorl, запоминаются в кэше, в том числе отсутствующие.
+    """
+    store = default.kvstore
+    if not isinstance(store, CachedDBStore):
+        return {key: store._get_raw(key) for key in keys}
+    found = store.cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        rows = dict(KVStoreModel.objects.filter(key__in=missing)
+                    .values_list('key', 'value'))
+        fetched = {key: rows.get(key, EMPTY_VALUE) for key in missing}
+        store.cache.set_many(fetched,
+                             thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+        found.update(fetched)
+    return {key: None if value == EMPTY_VALUE else value
+            for key, value in found.items()}
+
+
+def attach_thumbnails(posts):
+    """Находит готовые миниатюры всех пресетов для постов страницы.
+
+    Вместо обращения к хранилищу на каждый тег в шаблоне выполняется
+    один multi-get; результат кладётся в ``post._thumbnails``.
+    """
+    wanted = {}
+    for post in posts:
+        post._thumbnails = {}
+        if not post.image:
+            continue
+        for preset, (geometry, options) in settings.POST_THUMBNAILS.items():
+            thumbnail = backend.thumbnail_file(post.image, geometry,
+                                               **options)
+            wanted[(post, preset)] = add_prefix(thumbnail.key)
+    values = _lookup_many(list(set(wanted.values()))) if wanted else {}
+    for (post, preset), key in wanted.items():
+        value = values.get(key)
+        post._thumbnails[preset] = (
+            deserialize_image_file(value) if value else None
+        )
+    return posts
+
+
+def generate(name):
+    """Строит все миниатюры картинки ``name`` из ``POST_THUMBNAILS``."""
+    for geometry, options in settings.POST_THUMBNAILS.values():
+        get_thumbnail(name, geometry, **options)
+
+
+def build(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    generate(post.image.name)
+    # Страницы, закэшированные с оригиналом, пора перерисовать
+    from .signals import bump_post_pages
+    bump_post_pages(post, post.group_id)
+
+
+def build_missing(batch_size):
+    """Строит миниатюры постов, у которых готовы не все пресеты.
+
+    Посты перебираются пачками по ``batch_size`` с поиском миниатюр
+    одним запросом на пачку. Возвращает число достроенных постов.
+    """
+    built = 0
+    last_id = 0
+    while True:
+        posts = list(
+            Post.objects.filter(pk__gt=last_id).exclude(image='')
+            .exclude(image__isnull=True).order_by('pk')[:batch_size]
+        )
+        if not posts:
+            return built
+        for post in attach_thumbnails(posts):
+            if None in post._thumbnails.values():
+                build(post.pk)
+                built += 1
+        last_id = posts[-1].pk
+
+
+def schedule(post):
+    """Ставит построение миниатюр поста в очередь после коммита."""
+    if post.image:
+        background.on_commit(('thumbnails', post.pk), build, post.pk)
@@ -0,0 +1,241 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from . import background, cache_tags, metrics
+from .models import Follow, Post, TimelineEntry, UserStats
+
+PULLED_AUTHORS_KEY = 'timeline:pulled_authors:{version}'
+PULLED_TAG = 'pulled_authors'
+FEED_ORDERING = ('-pub_date', '-post_id')
+
+
+def _pulled_key():
+    return PULLED_AUTHORS_KEY.format(
+        version=cache_tags.versions(PULLED_TAG)[0],
+    )
+
+
+def pulled_authors():
+    """Авторы в режиме чтения (``UserStats.pulled``).
+
+    Их посты не раскладываются по лентам, а подмешиваются при чтении.
+    Множество пересчитывается не чаще раза в ``FEED_PULL_CACHE_TTL``
+    и сбрасывается во всех процессах, когда автор меняет режим:
+    версия тега ``pulled_authors`` входит в ключ.
+    """
+    key = _pulled_key()
+    authors = cache.get(key)
+    if authors is None:
+        authors = frozenset(
+            UserStats.objects.filter(pulled=True)
+            .values_list('user_id', flat=True)
+        )
+        cache.set(key, authors, settings.FEED_PULL_CACHE_TTL)
+    metrics.gauge('feed.fanout_threshold', settings.FEED_FANOUT_THRESHOLD)
+    metrics.gauge('feed.pulled_authors', len(authors))
+    return authors
+
+
+def is_pulled(author_id):
+    """Автор в режиме чтения: множество из кэша и свежий счётчик.
+
+    Посты не раскладываются, только если с этим согласны оба: по
+    устаревшему множеству пост уйдёт в ленты, а не пропадёт.
+    """
+    return author_id in pulled_authors() and UserStats.objects.filter(
+        user_id=author_id, pulled=True
+    ).exists()
+
+
+def _enter_pull_mode(authors):
+    return authors.filter(
+        pulled=False, followers__gt=settings.FEED_FANOUT_THRESHOLD
+    ).update(pulled=True)
+
+
+def _leave_pull_mode(authors):
+    return authors.filter(
+        pulled=True, followers__lte=settings.FEED_FANOUT_LEAVE_THRESHOLD
+    ).update(pulled=False)
+
+
+def followers_changed(author_id, delta):
+    """Переключает режим автора после подписки или отписки.
+
+    Автор переходит в режим чтения выше ``FEED_FANOUT_THRESHOLD``, а
+    возвращается только не выше ``FEED_FANOUT_LEAVE_THRESHOLD``: на
+    границе подписки и отписки не переключают режим туда и обратно.
+    Вернувшемуся автору последние посты дописываются в ленты
+    подписчиков фоновой задачей после коммита, вне запроса и его
+    блокировки записи; если задача не выполнилась, ленты восстановит
+    ``rebuild_timelines``.
+    """
+    authors = UserStats.objects.filter(user_id=author_id)
+    if delta > 0:
+        if _enter_pull_mode(authors):
+            cache_tags.bump(PULLED_TAG)
+    elif _leave_pull_mode(authors):
+        cache_tags.bump(PULLED_TAG)
+        background.on_commit(('timeline_backfill', author_id),
+                             backfill_followers, author_id)
+
+
+def follow_feed(user):
+    """Источники ленты подписок: своя лента и посты «тяжёлых» авторов.
+
+    Строки — словари ``pub_date``/``post_id`` в порядке ``FEED_ORDERING``:
+    своя лента читается по индексу ``(user, -pub_date, -post)`` таблицы
+    ``TimelineEntry``, сами посты выбирает ``posts_for`` для строк
+    страницы. Возвращает объединённый queryset (для нумерованных
+    страниц) и список источников для слияния при курсорной навигации.
+    """
+    pushed = TimelineEntry.objects.filter(user=user).values('pub_date',
+                                                            'post_id')
+    authors = pulled_authors()
+    pulled = []
+    if authors:
+        pulled = list(
+            Follow.objects.filter(user=user, author__in=authors)
+            .values_list('author_id', flat=True)
+        )
+    if not pulled:
+        return pushed, [pushed]
+    pulled_rows = (
+        Post.objects.filter(author_id__in=pulled)
+        .annotate(post_id=F('id')).values('pub_date', 'post_id')
+    )
+    combined = pushed.order_by().union(pulled_rows.order_by())
+    return combined, [pushed, pulled_rows]
+
+
+def posts_for(rows, posts=None):
+    """Посты строк ленты в их порядке одним запросом.
+
+    ``posts`` — queryset, из которого брать посты (модели или
+    ``values()``); по умолчанию ``Post.objects.for_feed()``.
+    """
+    if posts is None:
+        posts = Post.objects.for_feed()
+    ids = [row['post_id'] for row in rows]
+    found = {}
+    for post in posts.filter(pk__in=ids):
+        found[post['id'] if isinstance(post, dict) else post.pk] = post
+    return [found[pk] for pk in ids if pk in found]
+
+
+def _write(entries):
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост в ленты всех подписчиков автора."""
+    if is_pulled(post.author_id):
+        metrics.incr('feed.fanout.skipped')
+        return
+    follower_ids = (
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+        .iterator(chunk_size=settings.TIMELINE_BATCH_SIZE)
+    )
+    batch = []
+    for user_id in follower_ids:
+        batch.append(TimelineEntry(user_id=user_id, post_id=post.id,
+                                   author_id=post.author_id,
+                                   pub_date=post.pub_date))
+        if len(batch) >= settings.TIMELINE_BATCH_SIZE:
+            _write(batch)
+            batch = []
+    if batch:
+        _write(batch)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту читателя последние посты нового автора."""
+    if is_pulled(author_id):
+        return
+    _write([
+        TimelineEntry(user_id=user_id, post_id=post_id,
+                      author_id=author_id, pub_date=pub_date)
+        for post_id, pub_date in _latest_posts(author_id)
+    ])
+
+
+def _latest_posts(author_id):
+    return list(
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date', '-id')
+        .values_list('id', 'pub_date')[:settings.TIMELINE_BACKFILL]
+    )
+
+
+def backfill_followers(author_id):
+    """Дописывает последние посты автора в ленты всех его подписчиков."""
+    posts = _latest_posts(author_id)
+    if not posts:
+        return
+    follower_ids = (
+        Follow.objects.filter(author_id=author_id)
+        .values_list('user_id', flat=True)
+        .iterator(chunk_size=settings.TIMELINE_BATCH_SIZE)
+    )
+    batch = []
+    for user_id in follower_ids:
+        batch.extend(
+            TimelineEntry(user_id=user_id, post_id=post_id,
+                          author_id=author_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        )
+        if len(batch) >= settings.TIMELINE_BATCH_SIZE:
+            _write(batch)
+            batch = []
+    if batch:
+        _write(batch)
+    metrics.incr('feed.backfill.followers')
+
+
+def trim(user_id, author_id):
+    """Убирает из ленты читателя посты автора, от которого он отписался."""
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 author_id=author_id).delete()
+
+
+def rebuild(batch_size=None):
+    """Пересобирает ленты с нуля, по одному читателю на транзакцию.
+
+    Лента читателя удаляется и заполняется заново атомарно, остальные
+    ленты в это время не трогаются. Читатели выбираются пачками по
+    ``batch_size``. Перед этим режимы авторов сверяются с порогами.
+    Возвращает количество обработанных подписок.
+    """
+    batch_size = batch_size or settings.TIMELINE_BATCH_SIZE
+    if (_enter_pull_mode(UserStats.objects.all())
+            + _leave_pull_mode(UserStats.objects.all())):
+        cache_tags.bump(PULLED_TAG)
+    processed = 0
+    last_id = 0
+    while True:
+        readers = list(
+            Follow.objects.filter(user_id__gt=last_id).order_by('user_id')
+            .values_list('user_id', flat=True).distinct()[:batch_size]
+        )
+        if not readers:
+            break
+        for user_id in readers:
+            authors = list(Follow.objects.filter(user_id=user_id)
+                           .values_list('author_id', flat=True))
+            with transaction.atomic():
+                TimelineEntry.objects.filter(user_id=user_id).delete()
+                for author_id in authors:
+                    backfill(user_id, author_id)
+            processed += len(authors)
+        last_id = readers[-1]
+    TimelineEntry.objects.exclude(
+        user_id__in=Follow.objects.values('user_id')
+    ).delete()
+    return processed
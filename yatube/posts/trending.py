@@ -0,0 +1,153 @@
+"""Популярные посты и сообщества с экспоненциально затухающей оценкой.
+
+Событие веса ``w`` в момент ``t`` к моменту ``now`` даёт в оценку
+``w * exp(-λ (now - t))``, где ``λ = ln 2 / период полураспада``.
+Поэтому пересчёт инкрементальный: ``update`` умножает накопленные
+оценки на ``exp(-λ Δt)`` с прошлого запуска и добавляет только
+события, случившиеся после него. Страницы читают готовые таблицы
+``TrendingPost`` и ``TrendingGroup``.
+"""
+import datetime
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import cache_tags
+from .models import (Comment, Follow, Post, TrendingGroup, TrendingPost,
+                     TrendingRun)
+
+TAG = 'trending'
+
+
+def decay_rate():
+    return math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+
+
+def collect(since, now):
+    """Вклады событий окна ``(since, now]`` в оценки.
+
+    Оценки считаются для постов, групп и авторов.
+    """
+    rate = decay_rate()
+    weights = settings.TRENDING_WEIGHTS
+    posts = defaultdict(float)
+    groups = defaultdict(float)
+    post_groups = {}
+    authors = defaultdict(float)
+
+    def weight(kind, moment):
+        return weights[kind] * math.exp(
+            -rate * (now - moment).total_seconds()
+        )
+
+    published = Post.objects.filter(
+        pub_date__gt=since, pub_date__lte=now
+    ).values_list('id', 'group_id', 'pub_date')
+    for post_id, group_id, moment in published.iterator():
+        value = weight('post', moment)
+        posts[post_id] += value
+        post_groups[post_id] = group_id
+        if group_id is not None:
+            groups[group_id] += value
+    comments = Comment.objects.filter(
+        created__gt=since, created__lte=now
+    ).values_list('post_id', 'post__group_id', 'created')
+    for post_id, group_id, moment in comments.iterator():
+        value = weight('comment', moment)
+        posts[post_id] += value
+        post_groups[post_id] = group_id
+        if group_id is not None:
+            groups[group_id] += value
+    follows = Follow.objects.filter(
+        created__gt=since, created__lte=now
+    ).values_list('author_id', 'created')
+    for author_id, moment in follows.iterator():
+        authors[author_id] += weight('follow', moment)
+    return posts, post_groups, groups, authors
+
+
+def _add_scores(model, scores, fields=None):
+    """Прибавляет вклады к оценкам строк ``model`` с ключами из ``scores``.
+
+    ``fields(pk)`` даёт прочие поля строки, они обновляются вместе
+    с оценкой.
+    """
+    existing = model.objects.in_bulk(list(scores))
+    changed, created = [], []
+    names = ['score']
+    for pk, value in scores.items():
+        extra = fields(pk) if fields is not None else {}
+        names = ['score', *extra]
+        row = existing.get(pk)
+        if row is None:
+            created.append(model(pk=pk, score=value, **extra))
+            continue
+        row.score += value
+        for name, field_value in extra.items():
+            setattr(row, name, field_value)
+        changed.append(row)
+    model.objects.bulk_update(changed, names, batch_size=1000)
+    model.objects.bulk_create(created, batch_size=1000)
+
+
+def update(now=None):
+    """Учитывает события с прошлого запуска; возвращает число постов."""
+    now = now or timezone.now()
+    run = TrendingRun.objects.order_by('-finished_at').first()
+    if run is None:
+        run = TrendingRun(finished_at=now - datetime.timedelta(
+            days=settings.TRENDING_BACKFILL_DAYS))
+    since = run.finished_at
+    if now <= since:
+        return TrendingPost.objects.count()
+    factor = math.exp(-decay_rate() * (now - since).total_seconds())
+    posts, post_groups, groups, authors = collect(since, now)
+    with transaction.atomic():
+        TrendingPost.objects.update(score=F('score') * factor)
+        TrendingGroup.objects.update(score=F('score') * factor)
+        _add_scores(TrendingPost, posts,
+                    lambda pk: {'group_id': post_groups[pk]})
+        _add_scores(TrendingGroup, groups)
+        # Новые подписчики поднимают уже популярные посты автора
+        for author_id, value in authors.items():
+            TrendingPost.objects.filter(post__author_id=author_id).update(
+                score=F('score') + value
+            )
+        floor = settings.TRENDING_MIN_SCORE
+        TrendingPost.objects.filter(score__lt=floor).delete()
+        TrendingGroup.objects.filter(score__lt=floor).delete()
+        run.finished_at = now
+        run.save()
+    cache_tags.bump(TAG)
+    return TrendingPost.objects.count()
+
+
+def move_post(post):
+    """Переносит пост в популярном сообщества, куда его переместили.
+
+    ``update`` обновляет сообщество только у постов с новыми событиями,
+    без этого пост оставался бы на странице старого сообщества.
+    """
+    if TrendingPost.objects.filter(pk=post.pk).update(group=post.group_id):
+        cache_tags.bump(TAG)
+
+
+def top_posts(group=None, limit=None):
+    rows = TrendingPost.objects.all()
+    if group is not None:
+        rows = rows.filter(group=group)
+    rows = rows.select_related(
+        'post__author', 'post__group'
+    ).prefetch_related('post__image_variants').order_by('-score')
+    return [row.post for row in rows[:limit or settings.TRENDING_SIZE]]
+
+
+def top_groups(limit=None):
+    return list(
+        TrendingGroup.objects.select_related('group')
+        .order_by('-score')[:limit or settings.TRENDING_GROUPS]
+    )
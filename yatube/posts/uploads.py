@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from PIL import ImageFile
+
+# Сколько байт начала файла отдавать парсеру, чтобы узнать размеры
+PROBE_BYTES = 64 * 1024
+
+
+class ImageLimitUploadHandler(FileUploadHandler):
+    """Проверяет загружаемые картинки по мере поступления данных.
+
+    Ничего не сохраняет сам, а пропускает данные следующим
+    обработчикам. Файл больше ``POST_IMAGE_MAX_BYTES`` или с числом
+    пикселей больше ``POST_IMAGE_MAX_PIXELS`` (по заголовку, до
+    декодирования) отбрасывается сразу; причина записывается
+    в ``request.upload_errors`` для формы.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.parser = ImageFile.Parser()
+
+    def reject(self, message):
+        if not hasattr(self.request, 'upload_errors'):
+            self.request.upload_errors = {}
+        self.request.upload_errors[self.field_name] = message
+        raise SkipFile(message)
+
+    def probe(self, raw_data):
+        try:
+            self.parser.feed(raw_data)
+        except Exception:
+            # Пусть формат разбирает валидация формы
+            self.parser = None
+            return
+        image = self.parser.image
+        if image is None:
+            if self.received >= PROBE_BYTES:
+                self.parser = None
+            return
+        self.parser = None
+        width, height = image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            self.reject(
+                f'Слишком большое изображение: {width}x{height} пикселей.'
+            )
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            limit = settings.POST_IMAGE_MAX_BYTES // (1024 * 1024)
+            self.reject(f'Файл больше {limit} МБ.')
+        if self.parser is not None:
+            self.probe(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
@@ -1,18 +1,34 @@
 
 from django.urls import include, path
 
-from . import views
+from . import feeds, views
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group'),
+    path('group/<slug:slug>/trending/', views.group_trending,
+         name='group_trending'),
+    path('group/<slug:slug>/rss/', feeds.group_rss, name='group_rss'),
+    path('group/<slug:slug>/atom/', feeds.group_atom, name='group_atom'),
+    path('feeds/rss/', feeds.index_rss, name='index_rss'),
+    path('feeds/atom/', feeds.index_atom, name='index_atom'),
     path('new/', views.new_post, name='new_post'),
+    path('trending/', views.trending_view, name='trending'),
+    path('groups/', views.groups_view, name='groups'),
+    path('search/', views.search_view, name='search'),
+    path('autocomplete/', views.autocomplete_view, name='autocomplete'),
     path('about/', include('about.urls', namespace='about')),
     path(
         '<str:username>/follow/', views.profile_follow, name='profile_follow'
     ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('export/', views.export_view, name='export'),
+    path('metrics/', views.metrics_view, name='metrics'),
     path('<str:username>/', views.profile, name='profile'),
+    path('<str:username>/rss/', feeds.profile_rss, name='profile_rss'),
+    path('<str:username>/followers/', views.followers, name='followers'),
+    path('<str:username>/following/', views.following, name='following'),
+    path('<str:username>/atom/', feeds.profile_atom, name='profile_atom'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
     path(
         '<str:username>/<int:post_id>/edit/', views.post_edit, name='post_edit'
@@ -21,6 +37,10 @@ urlpatterns = [
         '<str:username>/<int:post_id>/comment/',
         views.add_comment, name='add_comment'
     ),
+    path(
+        '<str:username>/<int:post_id>/comments/',
+        views.post_comments_view, name='post_comments'
+    ),
     path('<str:username>/unfollow/',
          views.profile_unfollow, name='profile_unfollow'),
 ]
@@ -0,0 +1,87 @@
+"""Адаптивные варианты картинок постов (WebP, AVIF) для ``srcset``."""
+import hashlib
+import posixpath
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from . import background, imaging
+from .models import ImageVariant, Post
+
+VARIANTS_DIR = 'posts/variants'
+
+
+def card_aspect():
+    geometry, _ = settings.POST_THUMBNAILS['card']
+    width, height = geometry.split('x')
+    return int(width), int(height)
+
+
+def build(post_id):
+    """Строит варианты картинки поста в пуле процессов и записывает их."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    formats = imaging.supported_formats(settings.POST_IMAGE_FORMATS)
+    if not formats:
+        return
+    digest = hashlib.md5(post.image.name.encode()).hexdigest()[:8]
+    rendered = background.process_pool().submit(
+        imaging.render_variants,
+        post.image.path,
+        default_storage.path(VARIANTS_DIR),
+        f'{post.pk}-{digest}',
+        settings.POST_IMAGE_WIDTHS,
+        card_aspect(),
+        formats,
+        settings.POST_IMAGE_QUALITY,
+    ).result()
+    with transaction.atomic():
+        stale = list(post.image_variants.values_list('image', flat=True))
+        post.image_variants.all().delete()
+        ImageVariant.objects.bulk_create([
+            ImageVariant(post=post, format=fmt, width=width, height=height,
+                         image=posixpath.join(VARIANTS_DIR, name))
+            for fmt, width, height, name in rendered
+        ])
+    fresh = {posixpath.join(VARIANTS_DIR, name) for *_, name in rendered}
+    for name in set(stale) - fresh:
+        default_storage.delete(name)
+    from .signals import bump_post_pages
+    bump_post_pages(post, post.group_id)
+
+
+def discard(post):
+    """Удаляет варианты прежней картинки поста; файлы — после коммита.
+
+    Вызывается при замене или удалении картинки, чтобы ``srcset`` не
+    показывал старое изображение до пересборки.
+    """
+    stale = list(post.image_variants.values_list('image', flat=True))
+    if not stale:
+        return
+    post.image_variants.all().delete()
+
+    def delete_files():
+        for name in stale:
+            default_storage.delete(name)
+    transaction.on_commit(delete_files)
+
+
+def schedule(post):
+    if post.image:
+        background.on_commit(('variants', post.pk), build, post.pk)
+
+
+def sources(post):
+    """Элементы ``<source>`` для ``<picture>``: тип и ``srcset``."""
+    by_format = {}
+    for variant in post.image_variants.all():
+        by_format.setdefault(variant.format, []).append(
+            f'{variant.image.url} {variant.width}w'
+        )
+    return [
+        {'type': f'image/{fmt}', 'srcset': ', '.join(by_format[fmt])}
+        for fmt in settings.POST_IMAGE_FORMATS if fmt in by_format
+    ]
@@ -1,30 +1,50 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.views.decorators.http import condition
 
+from . import (autocomplete, cache_tags, counters, export, metrics,
+               rollups, search, suggestions, thumbnails, timeline,
+               trending, variants)
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post, User
+from .models import Follow, Group, Post, User
+from .paginator import paginate
+from .routers import replica_reads
+from .sqlite import atomic_with_retry
 
+# Ответ 304 без пагинатора и шаблона, если в области страницы не было
+# записей с момента прошлого ответа клиенту. ETag и Last-Modified
+# строятся по версиям тегов из общего для всех воркеров кэша
+conditional_page = condition(etag_func=cache_tags.page_etag,
+                             last_modified_func=cache_tags.page_last_modified)
 
+
+@conditional_page
+@replica_reads
 def index(request):
-    latest = Post.objects.all()
-    paginator = Paginator(latest, settings.PAGES)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = paginate(request, Post.objects.for_feed(),
+                    prepare=thumbnails.attach_thumbnails)
     return render(
         request,
         'index.html',
-        {'page': page}
+        {
+            'page': page,
+            'fragment_key': cache_tags.fragment_key(request, 'feed'),
+            'fragment_ttl': settings.FRAGMENT_CACHE_TTL,
+        }
     )
 
 
+@conditional_page
+@replica_reads
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, settings.PAGES)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    group = get_object_or_404(rollups.with_totals(Group.objects.all()),
+                              slug=slug)
+    rollups.attach_latest([group])
+    page = paginate(request, group.posts.for_feed(),
+                    prepare=thumbnails.attach_thumbnails)
     return render(
         request,
         'group.html',
@@ -32,13 +52,79 @@ def group_posts(request, slug):
     )
 
 
+@conditional_page
+def groups_view(request):
+    page = paginate(request, rollups.with_totals(Group.objects.all()),
+                    ordering=('title', 'id'), prepare=rollups.attach_latest)
+    return render(
+        request,
+        'groups.html',
+        {'page': page}
+    )
+
+
+def search_view(request):
+    query = request.GET.get('q', '').strip()
+    page = paginate(request, search.search_posts(query).for_feed(),
+                    ordering=('rank', 'id'),
+                    prepare=thumbnails.attach_thumbnails)
+    return render(
+        request,
+        'search.html',
+        {'page': page, 'query': query}
+    )
+
+
+def autocomplete_view(request):
+    results = autocomplete.search(request.GET.get('q', ''),
+                                  settings.AUTOCOMPLETE_LIMIT)
+    return JsonResponse({'results': [
+        {
+            'type': kind,
+            'value': value,
+            'label': label,
+            'url': (reverse('profile', args=[value]) if kind == 'user'
+                    else reverse('group', args=[value])),
+        }
+        for kind, value, label in results
+    ]})
+
+
+@conditional_page
+def trending_view(request):
+    posts = thumbnails.attach_thumbnails(trending.top_posts())
+    return render(
+        request,
+        'trending.html',
+        {'posts': posts, 'groups': trending.top_groups()}
+    )
+
+
+@conditional_page
+def group_trending(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    posts = thumbnails.attach_thumbnails(trending.top_posts(group=group))
+    return render(
+        request,
+        'trending.html',
+        {'posts': posts, 'group': group}
+    )
+
+
+def publish(post):
+    post.save()
+    thumbnails.schedule(post)
+    variants.schedule(post)
+
+
 @login_required
 def new_post(request):
-    form = PostForm(request.POST or None, files=request.FILES or None)
+    form = PostForm(request.POST or None, files=request.FILES or None,
+                    upload_errors=getattr(request, 'upload_errors', None))
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        atomic_with_retry(publish, post)
         return redirect('index')
     else:
         context = {
@@ -49,25 +135,27 @@ def new_post(request):
         return render(request, 'new.html', context)
 
 
+@conditional_page
+@replica_reads
 def profile(request, username):
-    poster = get_object_or_404(User, username=username)
-    user_posts = Post.objects.filter(author=poster)
-    num_posts = user_posts.count()
-    paginator = Paginator(user_posts, settings.PAGES)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    poster = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    stats = counters.user_stats(poster)
+    page = paginate(request, poster.posts.for_feed(),
+                    prepare=thumbnails.attach_thumbnails)
     following = ''
+    suggested = []
     if request.user.is_authenticated:
         following = Follow.objects.filter(
             user=request.user, author=poster).exists()
-    followers = Follow.objects.filter(author=poster).count()
-    followed = Follow.objects.filter(user=poster).count()
+        suggested = suggestions.for_user(request.user)
     context = {'poster': poster,
                'page': page,
-               'num_posts': num_posts,
+               'num_posts': stats.posts,
                'following': following,
-               'followers': followers,
-               'followed': followed,
+               'followers': stats.followers,
+               'followed': stats.following,
+               'suggestions': suggested,
                }
     return render(
         request,
@@ -76,19 +164,81 @@ def profile(request, username):
     )
 
 
+def follow_list(request, username, direction):
+    """Подписчики или подписки автора, листаемые курсором по ``Follow.id``.
+
+    Страница читает ``per_page + 1`` строк из индекса (author, user) или
+    (user, author) независимо от числа подписчиков.
+    """
+    poster = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    stats = counters.user_stats(poster)
+    person = 'user' if direction == 'followers' else 'author'
+    if direction == 'followers':
+        follows = poster.following.select_related(person)
+    else:
+        follows = poster.follower.select_related(person)
+
+    def attach_people(rows):
+        for row in rows:
+            row.person = getattr(row, person)
+        return rows
+
+    page = paginate(request, follows, ordering=('-id',),
+                    prepare=attach_people)
+    following = (
+        request.user.is_authenticated
+        and Follow.objects.filter(user=request.user, author=poster).exists()
+    )
+    return render(
+        request,
+        'follow_list.html',
+        {
+            'poster': poster,
+            'page': page,
+            'direction': direction,
+            'following': following,
+            'num_posts': stats.posts,
+            'followers': stats.followers,
+            'followed': stats.following,
+        }
+    )
+
+
+@conditional_page
+def followers(request, username):
+    return follow_list(request, username, 'followers')
+
+
+@conditional_page
+def following(request, username):
+    return follow_list(request, username, 'following')
+
+
+def load_post(username, post_id):
+    """Пост с автором, его счётчиками и группой одним запросом."""
+    return get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        pk=post_id, author__username=username,
+    )
+
+
+def post_comments(request, post):
+    return paginate(request, post.comments.select_related('author'),
+                    per_page=settings.COMMENTS_PER_PAGE,
+                    ordering=('-created', '-id'))
+
+
+@conditional_page
+@replica_reads
 def post_view(request, username, post_id):
-    poster = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post, pk=post_id, author__username=username)
-    num_posts = Post.objects.filter(author__username=username).count()
-    form = CommentForm()
-    comments = post.comments.all()
+    post = load_post(username, post_id)
     context = {
-        'comments': comments,
-        'poster': poster,
+        'comments': post_comments(request, post),
+        'poster': post.author,
         'post': post,
-        'num_posts': num_posts,
-        'comment': Comment.objects.filter(post=post),
-        'form': form,
+        'num_posts': counters.user_stats(post.author).posts,
+        'form': CommentForm(),
     }
     return render(
         request,
@@ -97,6 +247,17 @@ def post_view(request, username, post_id):
     )
 
 
+def post_comments_view(request, username, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    post = get_object_or_404(Post.objects.select_related('author'),
+                             pk=post_id, author__username=username)
+    return render(
+        request,
+        'includes/comment_list.html',
+        {'post': post, 'comments': post_comments(request, post)}
+    )
+
+
 @login_required
 def post_edit(request, username, post_id):
     author_id = get_object_or_404(User, username=username).id
@@ -105,10 +266,22 @@ def post_edit(request, username, post_id):
 
     post = get_object_or_404(Post, author__username=username, id=post_id)
     form = PostForm(request.POST or None,
-                    files=request.FILES or None, instance=post)
+                    files=request.FILES or None, instance=post,
+                    upload_errors=getattr(request, 'upload_errors', None))
 
     if form.is_valid():
-        form.save()
+        # comment_count меняется конкурентно, его не перезаписываем
+        post = form.save(commit=False)
+        image_changed = 'image' in form.changed_data
+
+        def save_post():
+            post.save(update_fields=PostForm.Meta.fields)
+            if image_changed:
+                variants.discard(post)
+        atomic_with_retry(save_post)
+        if image_changed:
+            thumbnails.schedule(post)
+            variants.schedule(post)
         return redirect('post', username, post_id)
     context = {
         'form': form,
@@ -123,7 +296,7 @@ def post_edit(request, username, post_id):
     )
 
 
-def page_not_found(request, exeptption):
+def page_not_found(request, exception):
     return render(
         request,
         'misc/404.html',
@@ -144,7 +317,7 @@ def add_comment(request, username, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        atomic_with_retry(comment.save)
         return redirect('post', username=username, post_id=post_id)
     context = {
         'form': form
@@ -153,14 +326,22 @@ def add_comment(request, username, post_id):
 
 
 @login_required
+@replica_reads
 def follow_index(request):
     user = request.user
-    followed_posts = Post.objects.filter(author__following__user=user)
-    paginator = Paginator(followed_posts, settings.PAGES)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    rows, sources = timeline.follow_feed(user)
+    page = paginate(
+        request, rows, ordering=timeline.FEED_ORDERING, sources=sources,
+        prepare=lambda rows: thumbnails.attach_thumbnails(
+            timeline.posts_for(rows)),
+    )
     context = {
-        'page': page
+        'page': page,
+        'suggestions': suggestions.for_user(user),
+        'fragment_key': cache_tags.fragment_key(
+            request, *cache_tags.follow_tags(user)
+        ),
+        'fragment_ttl': settings.FRAGMENT_CACHE_TTL,
     }
     return render(
         request,
@@ -174,15 +355,37 @@ def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
     if user != author:
-        Follow.objects.get_or_create(user=user, author=author)
+        atomic_with_retry(Follow.objects.get_or_create, user=user,
+                          author=author)
     return redirect('profile', username=author)
 
 
 @login_required
 def profile_unfollow(request, username):
-    get_object_or_404(
+    follow = get_object_or_404(
         Follow,
         user=request.user,
         author__username=username
-    ).delete()
+    )
+    atomic_with_retry(follow.delete)
     return redirect('profile', username)
+
+
+@login_required
+def export_view(request):
+    fmt = request.GET.get('format', 'jsonl')
+    if fmt not in export.FORMATS:
+        fmt = 'jsonl'
+    response = StreamingHttpResponse(export.stream(request.user, fmt),
+                                     content_type=export.CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = (
+        f'attachment; filename="yatube-{request.user.username}.{fmt}"'
+    )
+    return response
+
+
+@login_required
+def metrics_view(request):
+    if not request.user.is_staff:
+        return redirect('index')
+    return JsonResponse(metrics.snapshot())
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -39,7 +40,7 @@ ALLOWED_HOSTS = [
 INSTALLED_APPS = [
     'about',
     'users',
-    'posts',
+    'posts.apps.PostsConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -51,10 +52,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'posts.routers.StickyPrimaryMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -92,6 +96,53 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения страниц — копии основной базы. Пути к файлам
+# SQLite перечисляются через запятую в YATUBE_REPLICAS; в тестах
+# реплики смотрят в тестовую основную базу
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+        filter(None, os.environ.get('YATUBE_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['posts.routers.PrimaryReplicaRouter']
+
+# Профиль базы для продакшена включается YATUBE_DB_PROFILE=production:
+# WAL и прагмы на каждом соединении, соединения живут между запросами,
+# записи ждут блокировку и повторяются (см. posts.sqlite)
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+SQLITE_PRAGMAS = {}
+SQLITE_BUSY_TIMEOUT = 5
+SQLITE_WRITE_RETRIES = 0
+SQLITE_RETRY_DELAY = 0.05
+DB_PROFILE = os.environ.get('YATUBE_DB_PROFILE', 'development')
+if DB_PROFILE == 'production':
+    SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS
+    SQLITE_WRITE_RETRIES = 5
+    for database in DATABASES.values():
+        database['CONN_MAX_AGE'] = 600
+        database['OPTIONS'] = {'timeout': SQLITE_BUSY_TIMEOUT}
+
+# После записи пользователь столько секунд читает только основную
+# базу, чтобы видеть свои изменения, пока реплики догоняют
+REPLICA_STICKY_SECONDS = 10
+REPLICA_STICKY_COOKIE = 'read_primary'
+# Записи, которые делает сам пользователь; только они дают cookie
+REPLICA_STICKY_MODELS = {
+    'posts.post', 'posts.comment', 'posts.follow', 'posts.group',
+    'auth.user',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -144,8 +195,103 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 # Количество постов на странице
 PAGES = 10
 
+# Материализованная лента подписок: размер пачки при записи
+# и сколько последних постов автора добавлять при подписке
+TIMELINE_BATCH_SIZE = 1000
+TIMELINE_BACKFILL = 500
+
+# Авторы с числом подписчиков больше порога не раскладываются по лентам,
+# их посты подмешиваются в ленту при чтении (гибридная лента). Обратно
+# автор возвращается, только опустившись до нижнего порога
+FEED_FANOUT_THRESHOLD = 10000
+FEED_FANOUT_LEAVE_THRESHOLD = 9000
+FEED_PULL_CACHE_TTL = 300
+
+# Время жизни фрагментов ленты; свежесть обеспечивают версии в ключах
+FRAGMENT_CACHE_TTL = 300
+
+# Кэш страниц целиком для анонимных пользователей; 0 отключает
+ANONYMOUS_PAGE_CACHE_TTL = 600
+
+# Версии тегов (posts.cache_tags) должны быть общими для всех
+# процессов: иначе воркер, не видевший записи, продолжит отдавать
+# старые страницы и 304. Файловый кэш общий для процессов одной
+# машины; на нескольких машинах нужен memcached или redis
+CACHE_TAGS_ALIAS = 'tags'
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    CACHE_TAGS_ALIAS: {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_TAGS_DIR',
+            os.path.join(tempfile.gettempdir(), 'yatube-cache-tags'),
+        ),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Миниатюры картинок постов, которые строятся заранее после загрузки:
+# пресет -> (геометрия, опции sorl-thumbnail)
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
 }
+
+# Варианты картинок для srcset: ширины и форматы в порядке предпочтения
+# (неподдерживаемые установленным Pillow форматы пропускаются)
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_FORMATS = ('avif', 'webp')
+POST_IMAGE_QUALITY = 80
+
+# Приём картинок: лимиты проверяются во время загрузки, оригинал
+# уменьшается до POST_IMAGE_MAX_EDGE по большей стороне и теряет EXIF
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40_000_000
+POST_IMAGE_MAX_EDGE = 2560
+POST_IMAGE_INGEST_QUALITY = 90
+
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.ImageLimitUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Фоновые задачи: потоки, длина очереди и процессы для обработки картинок
+BACKGROUND_WORKERS = 2
+BACKGROUND_QUEUE_SIZE = 100
+IMAGE_PROCESS_WORKERS = 2
+
+# Комментариев на странице поста и в порции «Показать ещё»
+COMMENTS_PER_PAGE = 20
+
+# Сколько подсказок отдаёт автодополнение авторов и сообществ
+AUTOCOMPLETE_LIMIT = 10
+
+# Сколько строк выбирать из базы за раз при выгрузке данных пользователя
+EXPORT_CHUNK_SIZE = 2000
+
+# RSS/Atom: сколько последних постов в ленте и сколько хранить ответ
+FEED_ITEMS = 20
+FEED_CACHE_TTL = 600
+
+# «На кого подписаться»: build_suggestions хранит SUGGESTIONS_TOP_K
+# кандидатов на читателя, боковая панель показывает SUGGESTIONS_SHOWN
+SUGGESTIONS_TOP_K = 20
+SUGGESTIONS_SHOWN = 5
+SUGGESTIONS_BATCH_SIZE = 1000
+SUGGESTIONS_CO_FOLLOW_WEIGHT = 0.5
+SUGGESTIONS_MAX_AUTHOR_FOLLOWERS = 10000
+
+# Популярное: вес события затухает вдвое за TRENDING_HALF_LIFE_HOURS,
+# строки с оценкой ниже TRENDING_MIN_SCORE удаляются
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_WEIGHTS = {'post': 1.0, 'comment': 2.0, 'follow': 0.5}
+TRENDING_BACKFILL_DAYS = 7
+TRENDING_MIN_SCORE = 0.01
+TRENDING_SIZE = 20
+TRENDING_GROUPS = 10
+
+# Активные авторы сообщества считаются за столько последних дней
+GROUP_ACTIVE_DAYS = 30
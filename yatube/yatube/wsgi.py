@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# Индекс автодополнения строится до первого запроса к воркеру
+from django.db import DatabaseError  # noqa: E402
+from posts import autocomplete  # noqa: E402
+
+try:
+    autocomplete.warm()
+except DatabaseError:
+    pass